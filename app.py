@@ -1,311 +1,253 @@
+import os
+from datetime import datetime, timedelta
+
 import streamlit as st
-import folium
-from streamlit_folium import st_folium
-import requests
-import pandas as pd
 import urllib3
-import json
-from datetime import datetime
-import pytz
+
+from powermap import metrics, tiles
+from powermap.catalog import color_map, order_keys
+from powermap.feeds import MultiFeedFetcher, load_summary
+from powermap.history import HistoryStore
+from powermap.livemap import live_map
+from powermap.poller import SnapshotPoller
+from powermap.regions import regional_mix
+from powermap.render import build_map, build_unit_map, map_cache, snapshot_version
+from powermap.rollup import RollupStore
+from powermap.snapshot import TW_TZ
+from powermap.warmstart import WarmStart
 
 # --- 網頁設定 ---
 st.set_page_config(page_title="台灣電力即時戰情室", layout="wide", page_icon="⚡")
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# --- 1. 核心數據與設定 (維持原本 V9.1 邏輯) ---
-location_dict = {
-    "核一": [25.289, 121.589], "核二": [25.201, 121.666], "核三": [21.958, 120.752],
-    "台中": [24.213, 120.483], "麥寮": [23.793, 120.199], "和平": [24.307, 121.760],
-    "林口": [25.122, 121.298], "大林": [22.535, 120.336], "興達": [22.856, 120.198],
-    "大潭": [25.027, 121.047], "通霄": [24.491, 120.675], "協和": [25.155, 121.745],
-    "南部": [22.607, 120.294], "國光": [25.042, 121.341], "新桃": [24.814, 121.197],
-    "海湖": [25.116, 121.278], "長生": [25.116, 121.278], "星元": [24.079, 120.412], 
-    "嘉惠": [23.533, 120.475], "森霸": [23.083, 120.366], "豐德": [23.083, 120.366], 
-    "明潭": [23.839, 120.890], "大觀": [23.837, 120.898],
-    "德基": [24.256, 121.161], "青山": [24.223, 121.139], "谷關": [24.204, 121.082], 
-    "天輪": [24.185, 121.026], "馬鞍": [24.175, 120.941], "萬大": [23.977, 121.127], 
-    "卓蘭": [24.318, 120.835], "碧海": [24.293, 121.613], "立霧": [24.166, 121.637], 
-    "翡翠": [24.903, 121.564], "石門": [24.813, 121.246], "曾文": [23.250, 120.528], 
-    "烏山頭": [23.193, 120.460], "粗坑": [24.845, 121.189], "桂山": [24.916, 121.558],
-    "觀園": [25.039, 121.060], "觀園風力": [25.039, 121.060],
-    "大鵬": [24.606, 120.735], "大鵬風力": [24.606, 120.735],
-    "石門風力": [25.295, 121.565], "大潭風力": [25.030, 121.045], "蘆竹風力": [25.107, 121.272],
-    "大園風力": [25.077, 121.202], "香山風力": [24.757, 120.909],
-    "台中風力": [24.256, 120.505], "台中港": [24.256, 120.505], "彰工風力": [24.128, 120.422],
-    "王功風力": [23.971, 120.334], "彰濱風力": [24.062, 120.395], "永安風力": [22.822, 120.218],
-    "恆春風力": [21.954, 120.743], "中屯": [23.613, 119.605], "湖西": [23.582, 119.671],
-    "四湖風力": [23.635, 120.225], "雲麥風力": [23.766, 120.231],
-    "GENERIC_WIND": [24.05, 120.30],
-    "彰濱光": [24.062, 120.395], "彰濱太陽": [24.062, 120.395], "南鹽光": [23.189, 120.119], 
-    "台南鹽田": [23.189, 120.119], "七美": [23.208, 119.428], "望安": [23.369, 119.502],
-    "高訓光": [22.605, 120.310], "豐德光": [23.083, 120.366], "大潭光": [25.027, 121.047], 
-    "台中光": [24.213, 120.483], "興達光": [22.856, 120.198], "林口光": [25.122, 121.298],
-    "GENERIC_SOLAR": [23.15, 120.10],
-    "金門": [24.426, 118.396], "塔山": [24.426, 118.396], "珠山": [26.155, 119.927], 
-    "馬祖": [26.155, 119.927], "蘭嶼": [22.036, 121.556], "綠島": [22.663, 121.493]
-}
-
-def get_location_and_fix(name, p_type):
-    name_clean = name.replace("(", "").replace(")", "").replace(" ", "")
-    for key, coords in location_dict.items():
-        if key in name_clean: return coords, key
-    if "風" in str(p_type) or "Wind" in str(p_type): return location_dict["GENERIC_WIND"], "其他風力(彰化外海示意)"
-    if "光" in str(p_type) or "太陽" in str(p_type) or "Solar" in str(p_type): return location_dict["GENERIC_SOLAR"], "其他光電(南部示意)"
-    return None, name
-
-def get_style(row):
-    ft = str(row['type']); name = str(row['name'])
-    if "抽蓄" in ft or "明潭" in name or "大觀" in name: return "#9932CC", "抽蓄"
-    if "核能" in ft: return "yellow", "核能"
-    if "風力" in ft: return "#00FF00", "風力"
-    if "太陽" in ft or "光電" in ft: return "#FFA500", "太陽能"
-    if "水力" in ft: return "#00BFFF", "水力"
-    if "燃煤" in ft or "煤" in ft: return "#AAAAAA", "燃煤"
-    if "燃氣" in ft or "氣" in ft: return "#FF4500", "燃氣"
-    if "燃油" in ft or "柴油" in ft: return "#A0522D", "燃油"
-    return "#8B0000", "其他"
-
-# --- 2. 抓取資料 (UTF-8-SIG 修正版) ---
-@st.cache_data(ttl=60)
-def fetch_data():
+# --- 1. 核心數據與設定 (座標字典與分類規則見 powermap.catalog) ---
+REFRESH_SECONDS = 60
+HISTORY_DIR = os.environ.get("POWERMAP_HISTORY_DIR", "history")
+CACHE_DIR = os.environ.get("POWERMAP_CACHE_DIR", "cache")   # 暖啟動：最後一份成功的快照與地圖
+TREND_RANGES = {"6 小時": timedelta(hours=6), "24 小時": timedelta(days=1), "7 天": timedelta(days=7), "30 天": timedelta(days=30)}
+# 地圖模式：網址加上 ?map=live 改用增量更新 (保留縮放位置，適合長時間掛著的看板)
+LIVE_MAP = st.query_params.get("map") == "live"
+# ?map=units 改畫每一台機組 (canvas + 叢集，適合數千個點)
+UNIT_MAP = st.query_params.get("map") == "units"
+# ?regions=1 在電廠地圖下方疊一層分區 choropleth (北/中/南/東部與各離島的供電占比)
+REGION_LAYER = st.query_params.get("regions") == "1"
+# 量測：Prometheus 文字格式在 http://127.0.0.1:<port>/metrics (設為 0 關閉)；網址加上 ?debug=1 顯示除錯面板
+METRICS_PORT = int(os.environ.get("POWERMAP_METRICS_PORT", "9108"))
+DEBUG_PANEL = st.query_params.get("debug") == "1"
+MOVERS_TOP = 8   # 「變動最大」面板列出的筆數
+
+# --- 2. 抓取資料 (背景輪詢：整個伺服器行程共用一個抓取器與同一份快照) ---
+@st.cache_resource
+def get_history():
+    return HistoryStore(HISTORY_DIR)
+
+@st.cache_resource
+def get_rollups():
+    # 歷史資料在背景由新到舊回填 (整個月約十幾秒)，不擋住第一個頁面；回填完成前趨勢圖標示為部分資料
+    rollups = RollupStore()
+    return rollups.start_backfill(get_history(), datetime.now(TW_TZ) - TREND_RANGES["30 天"])
+
+@st.cache_resource
+def get_fetcher():
+    # 001.json 與附屬資料 (負載/備轉，POWERMAP_EXTRA_FEEDS) 每一輪並行抓取，各自逾時/退避/斷路
+    return MultiFeedFetcher()
+
+@st.cache_resource
+def get_poller():
+    # 先由磁碟讀回上一份快照與地圖 (標記為過期)，第一位訪客不必等台電回應
+    warm = WarmStart(CACHE_DIR)
+    restored = warm.load()
+    if restored is not None:
+        snapshot, map_html = restored
+        if map_html is not None:
+            map_cache.put(map_cache.render_key(snapshot, build_map), map_html)
+
+    def save_warm(snapshot):
+        # 背景執行緒先把地圖渲染好 (順便讓下一位訪客直接命中快取)，再整份寫到磁碟
+        warm.save(snapshot, map_cache.get_or_render(snapshot, build_map))
+
+    fetcher = get_fetcher()
+    poller = SnapshotPoller(fetcher.load, interval=REFRESH_SECONDS, initial=restored[0] if restored else None,
+                            commit=fetcher.commit)
+    poller.subscribe(get_history().append)       # 每份新快照寫入歷史資料
+    poller.subscribe(get_rollups().add_snapshot) # 並累加到 1分/15分/1時/1日 彙總
+    poller.subscribe(save_warm)
+    return poller.start()
+
+@st.cache_resource
+def get_metrics_server():
+    poller = get_poller()
+    metrics.REGISTRY.callback("powermap_snapshot_age_seconds", "距離上次成功向上游確認的秒數", poller.age_seconds)
+    metrics.REGISTRY.callback("powermap_snapshot_units", "目前快照的機組數",
+                              lambda: len(poller.snapshot.units) if poller.snapshot is not None else None)
+    metrics.REGISTRY.callback("powermap_render_cache_requests_total", "地圖/狀態快取查詢 (hit/miss)",
+                              lambda: {("hit",): map_cache.hits, ("miss",): map_cache.misses}, kind="counter", labelnames=("result",))
+    if not METRICS_PORT:
+        return None
+    try:
+        return metrics.serve(METRICS_PORT)
+    except OSError as e:   # 連接埠被占用 (例如同一台機器跑了兩個行程)：量測照常記錄，只是不對外提供
+        st.warning(f"量測端點無法啟動 (port {METRICS_PORT}): {e}")
+        return None
+
+@st.cache_resource
+def get_tile_server():
+    # 地圖改向本機代理要圖磚；背景補齊台灣範圍 zoom 7–12 的預載
+    if not tiles.TILES_PORT:
+        return None
+    if tiles.TILES_URL is None:
+        st.warning(f"圖磚代理綁在 {tiles.TILES_HOST or '所有位址'}，推不出瀏覽器該用的網址："
+                   "請設定 POWERMAP_TILES_URL (地圖暫時直接向 CartoDB 要圖磚)")
     try:
-        url = "https://service.taipower.com.tw/data/opendata/apply/file/d006001/001.json"
-        response = requests.get(url, verify=False)
-        try:
-            data = json.loads(response.content.decode('utf-8-sig'))
-        except:
-            data = json.loads(response.content.decode('utf-8'))
-            
-        raw_list = data['aaData'] if isinstance(data, dict) and 'aaData' in data else data
-        df = pd.DataFrame(raw_list)
-        target_cols = {'機組名稱': 'name', '機組類型': 'type', '淨發電量(MW)': 'gen'}
-        rename_dict = {}
-        for col in df.columns:
-            if col in target_cols: rename_dict[col] = target_cols[col]
-            elif "名稱" in col: rename_dict[col] = 'name'
-            elif "類型" in col: rename_dict[col] = 'type'
-            elif "淨發電量" in col and "比" not in col: rename_dict[col] = 'gen'
-        df.rename(columns=rename_dict, inplace=True)
-        df['gen'] = pd.to_numeric(df['gen'], errors='coerce').fillna(0)
-        return df
-    except Exception as e:
-        st.error(f"資料讀取錯誤: {e}")
-        return pd.DataFrame()
+        return tiles.serve()
+    except OSError as e:
+        st.warning(f"圖磚代理無法啟動 (port {tiles.TILES_PORT}): {e}")
+        return None
+
+poller = get_poller()
+get_metrics_server()
+get_tile_server()
 
 # --- 3. 主程式介面 ---
 st.title("⚡ 台灣電力即時戰情室 (HUD版)")
-tw_time = datetime.now(pytz.timezone('Asia/Taipei')).strftime("%Y-%m-%d %H:%M:%S")
-
-col1, col2 = st.columns([3, 1])
-with col1:
-    st.caption(f"最後更新時間: {tw_time} (數據每60秒自動更新)")
-with col2:
-    if st.button('🔄 手動更新'):
-        st.rerun()
-
-df = fetch_data()
-
-if not df.empty:
-    stats = {"核能":0, "燃氣":0, "燃煤":0, "燃油":0, "抽蓄":0, "水力":0, "風力":0, "太陽能":0}
-    plant_groups = {}
-    total_gen = 0
-    
-    for index, row in df.iterrows():
-        gen = max(0, row['gen'])
-        if gen > 0: total_gen += gen
-        
-        color, category = get_style(row)
-        if category in stats: 
-            if gen > 0: stats[category] += gen
+
+# 即時資料區 (讀快照 -> HUD -> 地圖) 以 fragment 每60秒自行重跑；
+# 頁面外框與標題不會跟著重跑，地圖內容沒變時 iframe 也不會重新載入
+@st.fragment(run_every=REFRESH_SECONDS)
+@metrics.timed('panel')
+def live_panel():
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        if st.button('🔄 手動更新'):
+            poller.refresh()
+
+    snapshot = poller.latest(timeout=30)
+
+    with col1:
+        if snapshot is not None and snapshot.restored:
+            st.caption(f"資料時間: {snapshot.fetched_at:%Y-%m-%d %H:%M:%S} ⚠️ 伺服器重新啟動，先顯示上次儲存的資料，正在向台電更新…")
+        elif snapshot is not None:
+            age = poller.age_seconds() or 0
+            stale = " ⚠️ 資料已過期" if age > 2 * REFRESH_SECONDS else ""
+            st.caption(f"資料時間: {snapshot.fetched_at:%Y-%m-%d %H:%M:%S} (上次確認 {age:.0f} 秒前，每{REFRESH_SECONDS}秒自動更新){stale}")
+        if poller.last_error is not None:
+            st.warning(f"資料讀取錯誤: {poller.last_error} (顯示最後一份成功取得的資料)")
+        if snapshot is not None and snapshot.feeds and 'load' in snapshot.feeds:
+            summary = load_summary(snapshot.feeds['load'])
+            if summary:
+                st.caption("📊 " + "　|　".join(f"{k} {v}" for k, v in summary.items()))
+
+    if snapshot is None:
+        st.error("目前無法取得台電資料，請稍後重試。")
+        return
+
+    map_col, trend_col = st.columns([3, 1])
+    with map_col:
+        if LIVE_MAP:
+            # --- 增量更新模式：底圖只送一次，之後只推送變動的圓點與 HUD 數字 ---
+            live_map(snapshot, height=750)
+        elif UNIT_MAP:
+            # --- 機組模式：每台機組一個點，資料整包交給前端叢集 ---
+            map_html = map_cache.get_or_compute(('units', snapshot_version(snapshot)), lambda: render_unit_map(snapshot))
+            st.iframe(map_html, height=750)
+        elif REGION_LAYER:
+            map_html = map_cache.get_or_compute(('regions-map', snapshot_version(snapshot)), lambda: render_region_map(snapshot))
+            st.iframe(map_html, height=750)
         else:
-            if "其他" not in stats: stats["其他"] = 0
-            if gen > 0: stats["其他"] += gen
-            
-        coords, plant_key = get_location_and_fix(str(row['name']), row['type'])
-        if coords:
-            if plant_key not in plant_groups:
-                plant_groups[plant_key] = {'coords': coords, 'type': category, 'color': color, 'total_gen': 0, 'details': []}
-            plant_groups[plant_key]['total_gen'] += row['gen']
-            plant_groups[plant_key]['details'].append(f"{row['name']}: {row['gen']} MW")
-
-    # --- 地圖繪製 ---
-    m = folium.Map(location=[23.6, 121.0], zoom_start=8, tiles='CartoDB dark_matter')
-
-    # 繪製圓點
-    for name, data in plant_groups.items():
-        gen_mw = data['total_gen']
-        radius = (abs(gen_mw) ** 0.5) * 0.8
-        if radius < 3: radius = 3
-        mw_text = f"{gen_mw:.1f} MW"
-        if gen_mw < 0: mw_text = f"<span style='color:red'>{gen_mw:.1f} (抽水/負載)</span>"
-        
-        popup_html = f"""
-        <div style="font-family: Arial; min-width: 150px;">
-            <b style="font-size:14px">{name}</b><br>
-            <span style="color:{data['color']}; font-weight:bold;">● {data['type']}</span><br>
-            <b>{mw_text}</b>
-            <hr style="margin:5px 0">
-            <div style="font-size:11px; color:#555">{"<br>".join(data['details'][:8])}</div>
-        </div>
-        """
-        folium.CircleMarker(
-            location=data['coords'], radius=radius, popup=folium.Popup(popup_html, max_width=250),
-            color=data['color'], fill=True, fill_opacity=0.8, weight=1
-        ).add_to(m)
-
-    # ---------------------------------------------------------
-    # 🌟 特色1: 懸浮置頂數據列 (HUD Top Bar) - 白色字體
-    # ---------------------------------------------------------
-    # 準備數據
-    fire_mw = stats['燃氣'] + stats['燃煤'] + stats['燃油']
-    green_mw = stats['風力'] + stats['太陽能']
-    
-    metrics_html = f'''
-    <div style="
-        position: fixed; 
-        top: 60px; 
-        left: 50%; 
-        transform: translateX(-50%);
-        z-index: 9999; 
-        background-color: rgba(20, 20, 20, 0.7); 
-        padding: 10px 20px; 
-        border-radius: 50px; 
-        border: 1px solid #444;
-        display: flex;
-        gap: 25px;
-        color: white;
-        font-family: 'Arial', sans-serif;
-        font-size: 14px;
-        backdrop-filter: blur(5px);
-        box-shadow: 0 4px 6px rgba(0,0,0,0.3);
-        white-space: nowrap;
-    ">
-        <div style="display:flex; flex-direction:column; align-items:center;">
-            <span style="font-size:10px; color:#aaa;">總發電量</span>
-            <span style="font-weight:bold; font-size:16px;">{total_gen:,.0f} <span style="font-size:10px">MW</span></span>
-        </div>
-        <div style="width:1px; background:#555;"></div>
-        <div style="display:flex; flex-direction:column; align-items:center;">
-            <span style="font-size:10px; color:#FF4500;">火力合計</span>
-            <span style="font-weight:bold;">{fire_mw:,.0f}</span>
-        </div>
-        <div style="display:flex; flex-direction:column; align-items:center;">
-            <span style="font-size:10px; color:yellow;">核能</span>
-            <span style="font-weight:bold;">{stats['核能']:,.0f}</span>
-        </div>
-        <div style="display:flex; flex-direction:column; align-items:center;">
-            <span style="font-size:10px; color:#00FF00;">風光綠能</span>
-            <span style="font-weight:bold;">{green_mw:,.0f}</span>
-        </div>
-        <div style="display:flex; flex-direction:column; align-items:center;">
-            <span style="font-size:10px; color:#9932CC;">抽蓄儲能</span>
-            <span style="font-weight:bold;">{stats['抽蓄']:,.0f}</span>
-        </div>
-    </div>
-    '''
-    m.get_root().html.add_child(folium.Element(metrics_html))
-
-    # ---------------------------------------------------------
-    # 🌟 特色2: 可拖曳圖例 (Draggable Legend)
-    # ---------------------------------------------------------
-    pcts = {}
-    if total_gen > 0:
-        for k, v in stats.items(): pcts[k] = (v / total_gen) * 100
-    
-    color_map = {
-        "核能": "yellow", "燃氣": "#FF4500", "燃煤": "#AAAAAA", "燃油": "#A0522D", 
-        "抽蓄": "#9932CC", "水力": "#00BFFF", "風力": "#00FF00", "太陽能": "#FFA500", "其他": "#333333"
-    }
-    order_keys = ["核能", "燃煤", "燃氣", "燃油", "抽蓄", "水力", "風力", "太陽能"]
-    
-    stops = []; acc = 0; legend_rows = ""
-    for key in order_keys:
-        if key in pcts:
-            val = pcts[key]
-            c = color_map[key]
-            stops.append(f"{c} {acc:.1f}% {acc + val:.1f}%")
-            acc += val
-            legend_rows += f'<div style="display:flex; justify-content:space-between; color:{c};"><span>■ {key}</span> <span>{val:.1f}%</span></div>'
-            
-    gradient_str = ", ".join(stops)
-    
-    # 注入 Javascript 來實現拖曳
-    legend_html = f'''
-     <div id="draggable-legend" style="
-        position: fixed; 
-        bottom: 30px; 
-        left: 30px; 
-        width: 260px; 
-        background-color: rgba(30, 30, 30, 0.9); 
-        color: white; 
-        z-index: 9999; 
-        padding: 15px; 
-        border-radius: 12px; 
-        border: 1px solid #555; 
-        font-family: Arial;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.5);
-        cursor: move; /* 鼠標變成移動十字 */
-        user-select: none; /* 防止拖曳時選取文字 */
-     ">
-         <div style="font-size:16px; font-weight:bold; margin-bottom:5px; border-bottom:1px solid #555;">
-            ⚡ 電力戰情 
-            <span style="font-size:10px; font-weight:normal; color:#aaa; float:right;">(可拖曳)</span>
-         </div>
-         <div style="display: flex; align-items: flex-start; margin-top:10px;">
-             <div style="width: 80px; height: 80px; border-radius: 50%; margin-right: 15px; flex-shrink: 0; background: conic-gradient({gradient_str}); border: 2px solid #fff;"></div>
-             <div style="font-size:12px; line-height: 1.5; width: 100%;">{legend_rows}</div>
-         </div>
-     </div>
-
-     <script>
-        // 簡單的拖曳腳本
-        (function() {{
-            var elmnt = document.getElementById("draggable-legend");
-            var pos1 = 0, pos2 = 0, pos3 = 0, pos4 = 0;
-            
-            elmnt.onmousedown = dragMouseDown;
-
-            function dragMouseDown(e) {{
-                e = e || window.event;
-                e.preventDefault();
-                // 取得滑鼠初始位置
-                pos3 = e.clientX;
-                pos4 = e.clientY;
-                document.onmouseup = closeDragElement;
-                document.onmousemove = elementDrag;
-            }}
-
-            function elementDrag(e) {{
-                e = e || window.event;
-                e.preventDefault();
-                // 計算位移
-                pos1 = pos3 - e.clientX;
-                pos2 = pos4 - e.clientY;
-                pos3 = e.clientX;
-                pos4 = e.clientY;
-                // 設定新位置
-                elmnt.style.top = (elmnt.offsetTop - pos2) + "px";
-                elmnt.style.left = (elmnt.offsetLeft - pos1) + "px";
-                // 清除 bottom 定位以免衝突
-                elmnt.style.bottom = "auto";
-            }}
-
-            function closeDragElement() {{
-                document.onmouseup = null;
-                document.onmousemove = null;
-            }}
-        }})();
-     </script>
-     '''
-    m.get_root().html.add_child(folium.Element(legend_html))
-
-    # 顯示地圖
-    st_folium(m, width="100%", height=750) # 高度增加讓地圖更滿版
-
-else:
-    st.error("目前無法取得台電資料，請稍後重試。")
+            # --- 地圖繪製 (同一份快照只渲染一次，所有使用者共用 HTML) ---
+            map_html = map_cache.get_or_render(snapshot, build_map)
+            st.iframe(map_html, height=750) # 高度增加讓地圖更滿版
+
+    with trend_col:
+        # --- 發電結構趨勢 (預先彙總 + LTTB 降採樣，不掃描原始歷史資料) ---
+        st.markdown("**⏱️ 發電結構趨勢 (MW)**")
+        label = st.radio("區間", list(TREND_RANGES), horizontal=True, key="trend_range", label_visibility="collapsed")
+        rollups = get_rollups()
+        start = datetime.now(TW_TZ) - TREND_RANGES[label]
+        mix = rollups.series(start, by='category', keys=order_keys, max_points=1500)
+        if rollups.backfilling and (rollups.covered_from is None or rollups.covered_from > start):
+            covered = "" if rollups.covered_from is None else f"，目前只有 {rollups.covered_from:%m/%d %H:%M} 之後"
+            st.caption(f"⏳ 歷史資料載入中 (部分資料{covered})")
+        if mix.empty:
+            st.caption("歷史資料累積中…")
+        else:
+            st.area_chart(mix, y=order_keys, color=[color_map[k] for k in order_keys], height=680)
+
+    # --- 各區域供電 (電廠所在分區在啟動時已算好，每份快照只是查表加總) ---
+    regions_panel(snapshot)
+
+    # --- 變動最大：與上一份快照的差異 (增量比對時順便算好，不必重新掃描機組表) ---
+    if snapshot.diff is not None and len(snapshot.diff.units):
+        movers_panel(snapshot)
 
+    if DEBUG_PANEL:
+        debug_panel(snapshot)
 
 
+@metrics.timed('render')
+def render_unit_map(snapshot):
+    return build_unit_map(snapshot.units, snapshot.stats, snapshot.total_gen).get_root().render()
+
+
+@metrics.timed('render')
+def render_region_map(snapshot):
+    regions = snapshot_regions(snapshot, 'zone')
+    return build_map(snapshot.stats, snapshot.total_gen, snapshot.plant_groups, regions=regions).get_root().render()
+
+
+def snapshot_regions(snapshot, level):
+    return map_cache.get_or_compute(('regions', level, snapshot_version(snapshot)), lambda: regional_mix(snapshot.units, level))
+
+
+def regions_panel(snapshot):
+    """各分區 (離島拆成金門/馬祖/澎湖/蘭嶼綠島) 的發電結構"""
+    mix = snapshot_regions(snapshot, 'zone')
+    categories = [c for c in mix.columns if c not in ('total', 'net')]
+    st.markdown("**🗺️ 各區域供電 (MW)**")
+    st.bar_chart(mix[categories], horizontal=True, color=[color_map.get(c, color_map['其他']) for c in categories], height=300)
+
+
+def movers_table(diff, by):
+    table = diff.movers(MOVERS_TOP, by=by)
+    names = table['name'] if by == 'units' else table.index
+    return {
+        "名稱": [f"⇄ {n}" if switched else n for n, switched in zip(names, table['switched'])],
+        "類別": table['category'].tolist(),
+        "前次 (MW)": table['prev_gen' if by == 'units' else 'prev_total'].round(1).tolist(),
+        "目前 (MW)": table['gen' if by == 'units' else 'total'].round(1).tolist(),
+        "變化 (MW)": table['delta'].round(1).tolist(),
+        "爬升 (MW/分)": table['ramp'].round(1).tolist(),
+    }
 
 
+def movers_panel(snapshot):
+    """與上一份快照相比變動最大的電廠與機組 (⇄ 表示抽水/發電切換)"""
+    diff = snapshot.diff
+    tables = map_cache.get_or_compute(('movers', snapshot_version(snapshot)),
+                                      lambda: (movers_table(diff, 'plants'), movers_table(diff, 'units')))
+    st.markdown(f"**🔀 變動最大 (與 {diff.minutes:.0f} 分鐘前相比，⇄ 為抽水/發電切換)**")
+    plant_col, unit_col = st.columns(2)
+    plant_col.dataframe(tables[0], hide_index=True)
+    unit_col.dataframe(tables[1], hide_index=True)
+
+
+def debug_panel(snapshot):
+    """各階段耗時 (p50/p95 為直方圖桶上界的估計值) 與快取狀態"""
+    with st.expander("🛠️ 除錯：處理階段耗時與快取", expanded=True):
+        rows = [{"階段": stage, "次數": s['count'], "平均 (ms)": round(s['sum'] / s['count'] * 1000, 1),
+                 "p50 ≤ (ms)": s['p50'] * 1000, "p95 ≤ (ms)": s['p95'] * 1000}
+                for (stage,), s in sorted(metrics.stage_seconds.summary().items()) if s['count']]
+        st.dataframe(rows, hide_index=True)
+        st.dataframe([{"資料來源": f['feed'], "斷路器": f['state'], "連續失敗": f['failures'],
+                       "上次確認 (秒前)": None if f['age'] is None else round(f['age']),
+                       "重試倒數 (秒)": round(f['retry_in']), "錯誤": f['error'] or ""}
+                      for f in get_fetcher().status()], hide_index=True)
+        upstream = ", ".join(f"{status} × {n}" for (status,), n in sorted(metrics.upstream_responses.values().items()))
+        diff = snapshot.diff
+        incremental = f"，增量更新 {len(diff.units)} 台 (連續 {diff.chain} 次)" if diff is not None and diff.incremental else ""
+        st.caption(f"快取命中 {map_cache.hits} / 未命中 {map_cache.misses}　|　上游回應 {upstream or '-'}"
+                   f"　|　快照 {snapshot.content_hash or '-'} ({len(snapshot.units)} 台機組{incremental})"
+                   + (f"　|　量測端點 http://127.0.0.1:{METRICS_PORT}/metrics" if METRICS_PORT else ""))
+
+
+live_panel()
@@ -0,0 +1,225 @@
+"""管線效能基準：decode -> DataFrame -> 分類 -> 電廠歸戶 -> 地圖 HTML -> m.save()
+
+完全離線執行。輸入可以是錄下來的 001.json (--payload，可多個)，或內建的合成資料
+(約 200 台機組，與台電實際規模相近)；再把機組複製放大到指定的規模 (預設到 5 萬台)。
+每個階段分開量測耗時 (多次取中位數) 與 tracemalloc 的峰值記憶體，結果存成 JSON，
+方便比較不同 commit：
+
+    python benchmarks/bench_pipeline.py                               # 預設規模，結果寫到 benchmarks/results/
+    python benchmarks/bench_pipeline.py --payload rec/*.json --sizes 200,5000 -r 5
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/old.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from powermap.aggregate import aggregate, classify_units  # noqa: E402
+from powermap.feed import decode_payload, units_frame  # noqa: E402
+from powermap.render import build_map  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_SIZES = (200, 1000, 5000, 20000, 50000)
+
+# 合成資料：台電的機組類型字串 + 該類型常見的電廠名稱
+SYNTHETIC_UNITS = (
+    ("核能(Nuclear)", ("核二", "核三"), 4),
+    ("燃煤(Coal)", ("台中", "興達", "大林", "林口"), 4),
+    ("民營電廠-燃煤(IPP-Coal)", ("麥寮", "和平"), 3),
+    ("燃氣(LNG)", ("大潭CC", "通霄CC", "協和", "南部CC", "興達CC"), 5),
+    ("民營電廠-燃氣(IPP-LNG)", ("國光", "新桃", "海湖", "長生", "星元", "嘉惠", "森霸", "豐德"), 2),
+    ("燃油(Oil)", ("協和",), 2),
+    ("輕油(Diesel)", ("塔山", "珠山", "蘭嶼", "綠島"), 2),
+    ("汽電共生(Co-Gen)", ("汽電共生",), 1),
+    ("水力(Hydro)", ("德基", "青山", "谷關", "天輪", "萬大", "翡翠", "石門", "曾文", "卓蘭", "碧海", "立霧", "小水力"), 2),
+    ("抽蓄發電(Pumped Gen)", ("明潭", "大觀二"), 4),
+    ("抽蓄負載(Pumping Load)", ("明潭", "大觀二"), 2),
+    ("風力(Wind)", ("大潭風力", "觀園風力", "石門風力", "台中港", "彰工風力", "中屯", "湖西", "海洋竹南", "離岸一期"), 3),
+    ("太陽能(Solar)", ("大潭光", "彰濱光", "南鹽光", "七美", "望安", "高訓光", "台南鹽田", "購買太陽能", "自用太陽能"), 2),
+    ("其它再生能源(Other Renewable Energy)", ("生質能",), 1),
+    ("儲能(Energy Storage System)", ("儲能",), 2),
+)
+
+
+def synthetic_rows(seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for p_type, names, units in SYNTHETIC_UNITS:
+        for name in names:
+            for i in range(1, units + 1):
+                low = -250 if "抽蓄負載" in p_type else 0
+                gen = "N/A" if rng.random() < 0.02 else f"{rng.uniform(low, 900):.1f}"
+                rows.append({"機組類型": p_type, "機組名稱": f"{name}#{i}", "裝置容量(MW)": "1000.0",
+                             "淨發電量(MW)": gen, "淨發電量/裝置容量比(%)": "50%", "備註": " "})
+    return rows
+
+
+def scale_payload(data, size, seed=0):
+    """把機組複製放大到 size 台 (名稱加後綴，發電量加擾動)，回傳 001.json 的 bytes"""
+    base = data["aaData"]
+    rng = random.Random(seed)
+    rows = []
+    for i in range(size):
+        row = dict(base[i % len(base)])
+        rep = i // len(base)
+        if rep:
+            row["機組名稱"] = f"{row['機組名稱']}-{rep}"
+            try:
+                row["淨發電量(MW)"] = f"{float(row['淨發電量(MW)']) * rng.uniform(0.8, 1.2):.1f}"
+            except (TypeError, ValueError):
+                pass
+        rows.append(row)
+    payload = {"": data.get("", "2024-01-01 12:00"), "aaData": rows}
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def load_payload(path):
+    with open(path, "rb") as f:
+        data = json.loads(f.read().decode("utf-8-sig"))
+    return data if isinstance(data, dict) else {"aaData": data}
+
+
+# ---------------------------------------------------------
+# 各階段 (每個函式吃上一階段的輸出)
+# ---------------------------------------------------------
+def pipeline(content, out_path):
+    """[(階段, 函式)]；每個函式吃上一階段的輸出"""
+    return [
+        ("decode", decode_payload),
+        ("frame", units_frame),
+        ("classify", classify_units),
+        ("group", aggregate),
+        ("render", lambda agg: _render(*agg)),
+        ("save", lambda m: m.save(out_path)),
+    ]
+
+
+def _render(stats, total_gen, plant_groups):
+    m = build_map(stats, total_gen, plant_groups)
+    m.get_root().render()
+    return m
+
+
+def measure(content, out_path, repeat):
+    """回傳 {階段: {'ms': [...], 'peak_kb': ...}}；計時與記憶體分兩輪，避免 tracemalloc 拖慢計時"""
+    stages = pipeline(content, out_path)
+    result = {name: {'ms': []} for name, _ in stages}
+    for _ in range(repeat):
+        value = content
+        for name, fn in stages:
+            t0 = time.perf_counter()
+            value = fn(value)
+            result[name]['ms'].append((time.perf_counter() - t0) * 1000)
+
+    value = content
+    tracemalloc.start()
+    try:
+        for name, fn in stages:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            value = fn(value)
+            result[name]['peak_kb'] = (tracemalloc.get_traced_memory()[1] - base) / 1024
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def summarize(result):
+    out = {}
+    for name, r in result.items():
+        ms = r['ms']
+        out[name] = {
+            'median_ms': round(statistics.median(ms), 3),
+            'min_ms': round(min(ms), 3),
+            'mean_ms': round(statistics.fmean(ms), 3),
+            'peak_kb': round(r['peak_kb'], 1),
+        }
+    return out
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import folium
+    import numpy
+    return {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__, 'numpy': numpy.__version__, 'folium': folium.__version__,
+    }
+
+
+def run(args):
+    sources = [(os.path.basename(p), load_payload(p)) for p in args.payload] or [("synthetic", {"aaData": synthetic_rows()})]
+    report = {'env': environment(), 'repeat': args.repeat, 'runs': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "map.html")
+        for source, data in sources:
+            sizes = args.sizes or [len(data["aaData"])]
+            for size in sizes:
+                content = scale_payload(data, size)
+                stages = summarize(measure(content, out_path, args.repeat))
+                report['runs'].append({'source': source, 'units': size, 'bytes': len(content),
+                                       'html_bytes': os.path.getsize(out_path), 'stages': stages})
+                total = sum(s['median_ms'] for s in stages.values())
+                cells = "  ".join(f"{k} {v['median_ms']:8.1f}ms/{v['peak_kb'] / 1024:6.1f}MB" for k, v in stages.items())
+                print(f"{source:>12} {size:>6} 台 | 合計 {total:8.1f}ms | {cells}")
+    return report
+
+
+def compare(base, new):
+    """以 (來源, 機組數, 階段) 對齊，印出中位數耗時的倍率"""
+    old = {(r['source'], r['units']): r['stages'] for r in base['runs']}
+    print(f"基準 {base['env'].get('commit')} -> 目前 {new['env'].get('commit')} (倍率 < 1 代表變快)")
+    for r in new['runs']:
+        prev = old.get((r['source'], r['units']))
+        if prev is None:
+            continue
+        cells = "  ".join(f"{k} x{v['median_ms'] / prev[k]['median_ms']:.2f}"
+                          for k, v in r['stages'].items() if k in prev and prev[k]['median_ms'] > 0)
+        print(f"{r['source']:>12} {r['units']:>6} 台 | {cells}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="powermap 管線效能基準")
+    parser.add_argument("--payload", nargs="*", default=[], help="錄下來的 001.json (預設使用內建合成資料)")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=list(DEFAULT_SIZES),
+                        help="逗號分隔的機組數 (預設 %s)" % ",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每個規模重複次數 (取中位數)")
+    parser.add_argument("--json", help="結果輸出路徑 (預設 benchmarks/results/<時間>-<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="與之前的結果 JSON 比較")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    path = args.json
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{report['env']['commit'] or 'nogit'}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""多人同時觀看的壓力測試：模擬 N 個 Streamlit session 並量測頁面就緒延遲與伺服器資源
+
+    # 自動啟動回放伺服器 + streamlit run app.py，模擬 50 人看 2 分鐘
+    python benchmarks/loadtest.py --sessions 50 --duration 120 --replay rec/ --speed 60
+
+    # 對已經在跑的伺服器 (需給 pid 才量得到 CPU / RSS)
+    python benchmarks/loadtest.py --app-url http://127.0.0.1:8501 --pid 12345 --sessions 20
+
+每個 session 直接走 Streamlit 的 websocket 協定 (與瀏覽器相同的 BackMsg / ForwardMsg)：
+連線 -> 送出 rerun_script -> 等到 script_finished 為「頁面就緒」；之後依 app 設定的
+fragment 自動更新週期送出 fragment rerun，直到測試結束。
+結果列出頁面就緒與 fragment 重跑的 p50 / p95 / p99、錯誤數，以及伺服器 CPU 與 RSS。
+
+需要 websockets (不在 app 的 requirements.txt 裡)：pip install -r benchmarks/requirements.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+# ---------------------------------------------------------
+# 伺服器資源 (讀 /proc，不依賴 psutil)
+# ---------------------------------------------------------
+class ProcessSampler:
+    def __init__(self, pid, every=0.5):
+        self.pid, self.every = pid, every
+        self.samples = []     # (時間, CPU 秒數, RSS bytes)
+        self._stop = threading.Event()
+        self._tick = os.sysconf('SC_CLK_TCK')
+        self._page = os.sysconf('SC_PAGE_SIZE')
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / self._tick      # utime + stime
+        with open(f"/proc/{self.pid}/statm") as f:
+            rss = int(f.read().split()[1]) * self._page
+        return time.monotonic(), cpu, rss
+
+    def start(self):
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.samples.append(self._read())
+                except (OSError, IndexError, ValueError):
+                    break
+                self._stop.wait(self.every)
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if len(self.samples) < 2:
+            return {}
+        (t0, c0, _), (t1, c1, _) = self.samples[0], self.samples[-1]
+        usage = [(b[1] - a[1]) / (b[0] - a[0]) * 100 for a, b in zip(self.samples, self.samples[1:]) if b[0] > a[0]]
+        rss = [s[2] for s in self.samples]
+        return {
+            'cpu_avg_pct': round((c1 - c0) / (t1 - t0) * 100, 1),
+            'cpu_peak_pct': round(max(usage), 1) if usage else None,
+            'rss_start_mb': round(rss[0] / 2 ** 20, 1),
+            'rss_peak_mb': round(max(rss) / 2 ** 20, 1),
+            'rss_end_mb': round(rss[-1] / 2 ** 20, 1),
+        }
+
+
+# ---------------------------------------------------------
+# 模擬 session
+# ---------------------------------------------------------
+def rerun_msg(query, fragment_id=None):
+    msg = BackMsg()
+    msg.rerun_script.query_string = query
+    msg.rerun_script.page_script_hash = ""
+    if fragment_id:
+        msg.rerun_script.fragment_id = fragment_id
+        msg.rerun_script.is_auto_rerun = True
+    return msg.SerializeToString()
+
+
+async def run_until_finished(ws, timeout):
+    """讀取 ForwardMsg 直到 script_finished；回傳 (狀態, 期間收到的 auto_rerun 設定)"""
+    auto = None
+    while True:
+        fm = ForwardMsg()
+        fm.ParseFromString(await asyncio.wait_for(ws.recv(), timeout))
+        kind = fm.WhichOneof('type')
+        if kind == 'auto_rerun':
+            auto = (fm.auto_rerun.interval, fm.auto_rerun.fragment_id)
+        elif kind == 'script_finished':
+            return fm.script_finished, auto
+
+
+async def session(ws_url, query, deadline, results, timeout, rerun_interval):
+    t0 = time.perf_counter()
+    try:
+        async with websockets.connect(ws_url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout) as ws:
+            await ws.send(rerun_msg(query))
+            status, auto = await run_until_finished(ws, timeout)
+            results['page_ready'].append(time.perf_counter() - t0)
+            if status != ForwardMsg.ScriptFinishedStatus.FINISHED_SUCCESSFULLY:
+                results['errors'].append(f"script_finished={status}")
+
+            # 依 fragment 的 run_every 週期自動重跑 (與瀏覽器行為相同)
+            while auto is not None:
+                interval = rerun_interval or auto[0]
+                if time.monotonic() + interval > deadline:
+                    break
+                await asyncio.sleep(interval)
+                t1 = time.perf_counter()
+                await ws.send(rerun_msg(query, auto[1]))
+                status, _ = await run_until_finished(ws, timeout)
+                results['fragment'].append(time.perf_counter() - t1)
+            await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+    except Exception as e:      # 連線失敗、逾時等都算錯誤，繼續測其他 session
+        results['errors'].append(f"{type(e).__name__}: {e}")
+
+
+async def drive(args, ws_url):
+    results = {'page_ready': [], 'fragment': [], 'errors': []}
+    deadline = time.monotonic() + args.ramp + args.duration
+    tasks = []
+    for i in range(args.sessions):
+        tasks.append(asyncio.create_task(session(ws_url, args.query, deadline, results, args.timeout, args.rerun_interval)))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.sessions * random.uniform(0.5, 1.5))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def percentiles(values):
+    if not values:
+        return None
+    q = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else [values[0]] * 99
+    return {'n': len(values), 'p50_ms': round(q[49] * 1000, 1), 'p95_ms': round(q[94] * 1000, 1),
+            'p99_ms': round(q[98] * 1000, 1), 'max_ms': round(max(values) * 1000, 1)}
+
+
+# ---------------------------------------------------------
+# 啟動受測環境 (回放伺服器 + streamlit)
+# ---------------------------------------------------------
+def start_replay(args):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import replay_server
+
+    options = replay_server.build_parser().parse_args([args.replay] if args.replay else [])
+    for name in ('speed', 'latency', 'jitter', 'error_rate', 'bom', 'columns'):
+        setattr(options, name, getattr(args, name))
+    server = replay_server.make_server(options, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_app(args, feed_url, workdir):
+    # 回放伺服器只提供 001.json：關閉附屬資料來源，壓測不連到台電
+    env = dict(os.environ, POWERMAP_FEED_URL=feed_url, POWERMAP_EXTRA_FEEDS="", POWERMAP_METRICS_PORT="0",
+               POWERMAP_HISTORY_DIR=os.path.join(workdir, "history"), POWERMAP_CACHE_DIR=os.path.join(workdir, "cache"))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+         "--server.port", str(args.port), "--browser.gatherUsageStats", "false"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    # 等到 health check 通過
+    import urllib.request
+    for _ in range(120):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/_stcore/health", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError("streamlit 啟動逾時")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模擬多個 Streamlit session 的壓力測試")
+    parser.add_argument("--sessions", type=int, default=20, help="同時觀看的 session 數")
+    parser.add_argument("--duration", type=float, default=60, help="全部連上後持續的秒數")
+    parser.add_argument("--ramp", type=float, default=5, help="在幾秒內陸續連上")
+    parser.add_argument("--query", default="", help="網址參數，例如 map=live")
+    parser.add_argument("--rerun-interval", type=float, default=None, help="覆寫 fragment 自動更新週期 (秒)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--app-url", help="已經在跑的 app (不指定則自動啟動 streamlit run app.py)")
+    parser.add_argument("--pid", type=int, help="--app-url 模式下伺服器的 pid (量測 CPU / RSS)")
+    parser.add_argument("--port", type=int, default=8599, help="自動啟動時使用的連接埠")
+    parser.add_argument("--workdir", default=os.path.join("benchmarks", "results", "loadtest"), help="自動啟動時的歷史/快取資料夾")
+    parser.add_argument("--json", help="結果輸出路徑")
+    # 回放伺服器選項 (自動啟動模式)
+    parser.add_argument("--replay", help="錄下來的 001.json (資料夾/zip/tar)，預設合成資料")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--bom", default="keep")
+    parser.add_argument("--columns", default="keep")
+    args = parser.parse_args(argv)
+
+    proc = replay = None
+    if args.app_url:
+        base, pid = args.app_url.rstrip('/'), args.pid
+    else:
+        replay = start_replay(args)
+        feed_url = f"http://127.0.0.1:{replay.server_port}/001.json"
+        proc = start_app(args, feed_url, args.workdir)
+        base, pid = f"http://127.0.0.1:{args.port}", proc.pid
+    ws_url = base.replace("http", "ws", 1) + "/_stcore/stream"
+
+    sampler = ProcessSampler(pid).start() if pid else None
+    started = time.monotonic()
+    try:
+        results = asyncio.run(drive(args, ws_url))
+    finally:
+        resources = sampler.stop() if sampler else {}
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if replay is not None:
+            replay.shutdown()
+
+    report = {
+        'sessions': args.sessions, 'duration_s': round(time.monotonic() - started, 1), 'query': args.query,
+        'page_ready': percentiles(results['page_ready']), 'fragment_rerun': percentiles(results['fragment']),
+        'errors': len(results['errors']), 'error_samples': sorted(set(results['errors']))[:5],
+        'server': resources, 'upstream': dict(replay.stats) if replay else None,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""台電 001.json 回放伺服器：依時間輪播錄下來的快照，並可注入延遲、5xx 與格式變化
+
+    python benchmarks/replay_server.py rec/ --port 8700 --speed 60
+    POWERMAP_FEED_URL=http://127.0.0.1:8700/001.json streamlit run app.py
+
+快照依資料時間 (檔內 "" 欄位，沒有時以 --interval 等距排列) 換頁；--speed 60 代表
+1 秒走完錄製時的 1 分鐘。沒有指定來源時使用 bench_pipeline 的合成資料。
+回應帶 ETag / Last-Modified，支援條件式請求 (與台電相同的 304 行為)。
+
+故障注入：
+    --latency 200 --jitter 100   每個請求延遲 200±100 ms
+    --error-rate 0.05            5% 的請求回 503 (--error-status 可改)
+    --bom add|strip|random|keep  加上 / 去掉 UTF-8 BOM
+    --columns variant|random     改用其他欄位名稱 (測試欄位容錯)
+
+random 是「每份快照隨機固定一種」：同一份快照重複請求拿到相同的 bytes，
+客戶端的內容雜湊不會把它誤判成新資料。
+"""
+import argparse
+import codecs
+import email.utils
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import synthetic_rows  # noqa: E402
+from powermap.feed import iter_recorded  # noqa: E402
+
+# 台電曾經出現過 / 可能出現的欄位名稱寫法
+COLUMN_VARIANTS = {
+    '機組名稱': '機組名稱(Unit)',
+    '機組類型': '機組類型(Type)',
+    '淨發電量(MW)': '淨發電量 (MW)',
+}
+
+
+class Frame:
+    """一份快照：原始內容 + 各種變形 (第一次用到時才產生)"""
+
+    def __init__(self, name, content, at):
+        self.name, self.content, self.at = name, content, at
+        self._variants = {}
+
+    def pick(self, option, choices):
+        """random 模式的變形：由快照名稱決定，同一份快照每次都一樣"""
+        return random.Random(f"{self.name}:{option}").choice(choices)
+
+    def body(self, bom, columns):
+        key = (bom, columns)
+        if key not in self._variants:
+            body = self.content
+            if columns == 'variant':
+                data = json.loads(body.decode('utf-8-sig'))
+                rows = data['aaData'] if isinstance(data, dict) else data
+                rows[:] = [{COLUMN_VARIANTS.get(k, k): v for k, v in r.items()} for r in rows]
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            if bom == 'add' and not body.startswith(codecs.BOM_UTF8):
+                body = codecs.BOM_UTF8 + body
+            elif bom == 'strip' and body.startswith(codecs.BOM_UTF8):
+                body = body[3:]
+            self._variants[key] = (body, '"%s"' % hashlib.md5(body).hexdigest())
+        return self._variants[key]
+
+
+def load_frames(source, interval):
+    """(名稱, bytes) -> [Frame]，依資料時間排序，at 為相對第一份的秒數"""
+    if source:
+        items = list(iter_recorded(source))
+    else:
+        items = [("synthetic.json", json.dumps({"": "2024-01-01 12:00", "aaData": synthetic_rows()},
+                                               ensure_ascii=False).encode('utf-8'))]
+    stamps = []
+    for name, content in items:
+        try:
+            data = json.loads(content.decode('utf-8-sig'))
+            stamp = pd.to_datetime(data.get('') if isinstance(data, dict) else None, errors='coerce')
+        except ValueError:
+            stamp = pd.NaT
+        stamps.append(stamp)
+    if all(not pd.isna(s) for s in stamps) and len(set(stamps)) == len(stamps):
+        order = sorted(range(len(items)), key=lambda i: stamps[i])
+        t0 = stamps[order[0]]
+        return [Frame(items[i][0], items[i][1], (stamps[i] - t0).total_seconds()) for i in order]
+    return [Frame(name, content, i * interval) for i, (name, content) in enumerate(items)]
+
+
+class Replay:
+    def __init__(self, frames, speed=1.0, loop=True):
+        self.frames = frames
+        self.speed = speed
+        self.loop = loop
+        self.span = frames[-1].at + (frames[1].at - frames[0].at if len(frames) > 1 else 60)
+        self.started = time.monotonic()
+        self.wall_start = time.time()
+
+    def current(self):
+        """(目前這一份, 它開始生效的實際時間 epoch 秒)"""
+        t = (time.monotonic() - self.started) * self.speed
+        if self.loop:
+            cycle, t = divmod(t, self.span)
+        else:
+            cycle = 0
+        frame = self.frames[0]
+        for f in self.frames:
+            if f.at <= t:
+                frame = f
+        return frame, self.wall_start + (cycle * self.span + frame.at) / self.speed
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    replay = None
+    options = None
+    stats = None
+    lock = None     # stats 由各個請求執行緒累加
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def do_GET(self):
+        opts = self.options
+        self._count('requests')
+        delay = max(0.0, opts.latency + random.uniform(-opts.jitter, opts.jitter)) / 1000
+        if delay:
+            time.sleep(delay)
+        if random.random() < opts.error_rate:
+            self._count('errors')
+            self._send(opts.error_status, b"upstream error", "text/plain")
+            return
+
+        frame, since = self.replay.current()
+        bom = frame.pick('bom', ('add', 'strip')) if opts.bom == 'random' else opts.bom
+        columns = frame.pick('columns', ('keep', 'variant')) if opts.columns == 'random' else opts.columns
+        body, etag = frame.body(bom, columns)
+        headers = {'ETag': etag, 'Last-Modified': email.utils.formatdate(since, usegmt=True),
+                   'X-Replay-Frame': frame.name.encode('ascii', 'replace').decode()}
+        if self.headers.get('If-None-Match') == etag:
+            self._count('not_modified')
+            self._send(304, b"", None, headers)
+            return
+        self._send(200, body, "application/json", headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(options, host="127.0.0.1", port=8700):
+    frames = load_frames(options.source, options.interval)
+    replay = Replay(frames, options.speed, not options.no_loop)
+    stats = {'requests': 0, 'errors': 0, 'not_modified': 0}
+    handler = type("Handler", (ReplayHandler,), {'replay': replay, 'options': options, 'stats': stats,
+                                                 'lock': threading.Lock()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.replay, server.stats = replay, stats
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="台電 001.json 回放伺服器")
+    parser.add_argument("source", nargs="?", help="錄下來的 001.json：資料夾、zip 或 tar(.gz) (預設合成資料)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--speed", type=float, default=1.0, help="播放倍速 (60 = 1 秒走 1 分鐘)")
+    parser.add_argument("--interval", type=float, default=60, help="快照沒有資料時間時的間隔秒數")
+    parser.add_argument("--no-loop", action="store_true", help="播完停在最後一份")
+    parser.add_argument("--latency", type=float, default=0, help="每個請求的延遲 (ms)")
+    parser.add_argument("--jitter", type=float, default=0, help="延遲的隨機變動幅度 (ms)")
+    parser.add_argument("--error-rate", type=float, default=0, help="回傳錯誤的比例 (0~1)")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--bom", choices=("keep", "add", "strip", "random"), default="keep")
+    parser.add_argument("--columns", choices=("keep", "variant", "random"), default="keep")
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    server = make_server(options, options.host, options.port)
+    print(f"回放 {len(server.replay.frames)} 份快照 (x{options.speed}): http://{options.host}:{server.server_port}/001.json")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""台灣電力即時戰情地圖 - app.py 與 appv9.py 共用的資料處理模組"""
@@ -0,0 +1,149 @@
+"""向量化分類與彙總 (取代逐列 df.iterrows() 迴圈)
+
+分類與電廠歸戶都只在「不重複的類型/名稱」上做字串比對 (電廠名稱交給
+catalog.plant_matcher 的快取)，再以整數代碼展開回每一列；統計則一次完成。
+分類依 catalog.STYLE_RULES 的順序取第一條符合的規則，電廠歸戶見 catalog.plant_matcher。
+"""
+import numpy as np
+import pandas as pd
+
+from .catalog import (
+    GENERIC_SOLAR_KEY, GENERIC_WIND_KEY, OTHER_CATEGORY, OTHER_COLOR,
+    STATS_KEYS, STYLE_RULES, location_dict, plant_matcher,
+)
+
+_CATEGORIES = np.array([r[0] for r in STYLE_RULES] + [OTHER_CATEGORY], dtype=object)
+_COLORS = np.array([r[1] for r in STYLE_RULES] + [OTHER_COLOR], dtype=object)
+
+DETAIL_LIMIT = 8   # popup 顯示的機組明細筆數
+
+# 電廠鍵值 -> 座標 (含模糊歸戶鍵值)
+PLANT_COORDS = {k: tuple(v) for k, v in location_dict.items()}   # tuple：各快照共用，不能被改
+PLANT_COORDS[GENERIC_WIND_KEY] = PLANT_COORDS["GENERIC_WIND"]
+PLANT_COORDS[GENERIC_SOLAR_KEY] = PLANT_COORDS["GENERIC_SOLAR"]
+
+
+class PlantGroup:
+    """一座電廠的歸戶結果 (唯讀)
+
+    機組只記錄在快照機組表中的列號 (numpy 切片，不複製)；popup 用的
+    「名稱: 發電量 MW」明細第一次用到時才格式化，而且只做前 DETAIL_LIMIT 筆。
+    仍可用 group['total_gen'] / group['details'] 的方式讀取。
+    """
+    __slots__ = ('key', 'coords', 'type', 'color', 'total_gen', 'rows', '_names', '_gens', '_details')
+    FIELDS = ('key', 'coords', 'type', 'color', 'total_gen', 'details', 'unit_count')
+
+    def __init__(self, key, coords, p_type, color, total_gen, rows, names, gens):
+        for field, value in zip(self.__slots__, (key, coords, p_type, color, total_gen, rows, names, gens, None)):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} 是唯讀的")
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __reduce__(self):
+        return PlantGroup, (self.key, self.coords, self.type, self.color, self.total_gen, self.rows, self._names, self._gens)
+
+    @property
+    def details(self):
+        if self._details is None:
+            object.__setattr__(self, '_details', tuple(
+                f"{self._names[r]}: {self._gens[r]} MW" for r in self.rows[:DETAIL_LIMIT]))
+        return self._details
+
+    @property
+    def unit_count(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return f"PlantGroup({self.key!r}, {self.type}, {self.total_gen:.1f} MW, {self.unit_count} 台)"
+
+
+def _contains_any(values, words):
+    # values: 不重複字串的 numpy 字串陣列；回傳 bool ndarray
+    hit = np.zeros(len(values), dtype=bool)
+    for w in words:
+        hit |= np.char.find(values, w) >= 0
+    return hit
+
+
+def _resolve_plant_keys(name_codes, name_uniques, type_codes, type_uniques):
+    # 每個不重複名稱查一次 (已快取的) 比對器；未命中者再依 (名稱, 類型) 組合模糊歸戶
+    name_uniques, type_uniques = name_uniques.tolist(), type_uniques.tolist()
+    exact = np.array([plant_matcher.match(n) for n in name_uniques], dtype=object)
+    keys = exact[name_codes]
+    miss = np.flatnonzero(pd.isna(keys))
+    if miss.size:
+        pair_codes, pairs = pd.factorize(name_codes[miss] * len(type_uniques) + type_codes[miss])
+        resolved = [plant_matcher.resolve(name_uniques[p // len(type_uniques)], type_uniques[p % len(type_uniques)])
+                    for p in pairs]
+        resolved = np.array([key if coords is not None else None for coords, key in resolved], dtype=object)
+        keys[miss] = resolved[pair_codes]
+    return keys
+
+
+def classify_units(df):
+    """為機組表加上 category / color / plant_key 欄位 (其餘欄位原樣保留)"""
+    # pandas 3 的 astype(str) 會保留缺值，factorize 給它 -1 (拿來索引會取到最後一個值)；
+    # 與舊版逐列 str(None) 一致，缺值當成字串 'None'
+    names = df['name'].astype(str).fillna('None')
+    types = df['type'].astype(str).fillna('None')
+    name_codes, name_uniques = pd.factorize(names)
+    type_codes, type_uniques = pd.factorize(types)
+    name_uniques = np.asarray(name_uniques, dtype=str)
+    type_uniques = np.asarray(type_uniques, dtype=str)
+
+    # 1. 類別：依 STYLE_RULES 優先順序，np.select 取第一個成立的條件
+    conditions = [
+        _contains_any(type_uniques, type_words)[type_codes] | _contains_any(name_uniques, name_words)[name_codes]
+        for _, _, type_words, name_words in STYLE_RULES
+    ]
+    rule_idx = np.select(conditions, np.arange(len(STYLE_RULES)), default=len(STYLE_RULES))
+
+    # 2. 電廠歸戶：先精確比對名稱，再依類型模糊歸戶
+    plant_keys = _resolve_plant_keys(name_codes, name_uniques, type_codes, type_uniques)
+
+    return df.assign(category=_CATEGORIES[rule_idx], color=_COLORS[rule_idx], plant_key=plant_keys)
+
+
+def aggregate(units):
+    """由 classify_units() 的結果產生 (stats, total_gen, plant_groups)
+
+    單一快照的快速路徑：以 factorize + np.bincount 取代 groupby，
+    避免 pandas 在小表上的固定開銷。
+    """
+    gen = units['gen'].to_numpy(dtype=float)
+    pos = np.clip(gen, 0, None)
+
+    cat_codes, cat_uniques = pd.factorize(units['category'])
+    cat_sums = dict(zip(cat_uniques, np.bincount(cat_codes, weights=pos, minlength=len(cat_uniques)).tolist()))
+    stats = {k: cat_sums.get(k, 0) for k in STATS_KEYS}
+    if OTHER_CATEGORY in cat_sums:
+        stats[OTHER_CATEGORY] = cat_sums[OTHER_CATEGORY]
+    total_gen = float(pos.sum())
+
+    # 電廠：代碼依首次出現順序編號 (未歸戶者為 -1)
+    plant_codes, plant_uniques = pd.factorize(units['plant_key'])
+    located = np.flatnonzero(plant_codes >= 0)
+    codes = plant_codes[located]
+    n_plants = len(plant_uniques)
+    totals = np.bincount(codes, weights=gen[located], minlength=n_plants).tolist()
+    order = located[np.argsort(codes, kind='stable')]
+    counts = np.bincount(codes, minlength=n_plants)
+    bounds = np.cumsum(counts)
+    starts = bounds - counts     # 沒有任何機組歸戶時為空陣列
+
+    names = units['name'].to_numpy()
+    gens = units['gen'].to_numpy()
+    firsts = order[starts]
+    categories = units['category'].to_numpy()[firsts]
+    colors = units['color'].to_numpy()[firsts]
+    plant_groups = {
+        key: PlantGroup(key, PLANT_COORDS[key], categories[i], colors[i], totals[i], order[starts[i]:bounds[i]], names, gens)
+        for i, key in enumerate(plant_uniques)
+    }
+    return stats, total_gen, plant_groups
@@ -0,0 +1,231 @@
+"""輕量 JSON / GeoJSON API (不需要 Streamlit)
+
+    python -m powermap.api --port 8080
+
+    GET /snapshot        HUD 數字、各類別發電量與百分比
+    GET /plants.geojson  電廠圓點 (鍵值、座標、淨發電量、類別、顏色)
+    GET /units           機組表 (name / type / gen / category / plant_key)
+    GET /regions         各區域 / 分區的發電量與發電結構 (北/中/南/東部、金門、馬祖、澎湖、蘭嶼綠島)
+    GET /changes         與上一份快照相比變動最大的電廠與機組 (變化量、MW/分爬升率)
+    GET /metrics         Prometheus 量測 (同 powermap.metrics)
+
+與 app.py 共用同一套抓取/分類/歸戶流程。每份新快照進來時把所有回應一次算好
+(JSON 內容、強 ETag、gzip 與 brotli 壓縮版)，之後的請求只是挑一份 bytes 寫出去。
+"""
+import argparse
+import gzip
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .metrics import REGISTRY, timed
+from .overlay import hud_totals, legend_items
+from .poller import SnapshotPoller
+from .regions import regional_mix
+from .render import snapshot_version
+
+try:
+    import brotli   # 選用：有安裝才提供 br 壓縮
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+MIN_COMPRESS_BYTES = 512
+CHANGES_TOP = 20   # /changes 列出的電廠與機組筆數
+
+
+class Response:
+    """一份預先算好的回應：原始內容 + 各種壓縮版本"""
+    __slots__ = ('body', 'content_type', 'etag', 'encoded')
+
+    def __init__(self, body, content_type, etag):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.encoded = {}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.encoded['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encoded['br'] = brotli.compress(body, quality=11)
+
+    def pick(self, accept_encoding):
+        """依 Accept-Encoding 選 (編碼, 內容)；br 優先於 gzip"""
+        accepted = {part.split(';')[0].strip() for part in (accept_encoding or "").lower().split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encoded and encoding in accepted:
+                return encoding, self.encoded[encoding]
+        return None, self.body
+
+
+def _json(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def snapshot_summary(snapshot):
+    return {
+        'fetched_at': snapshot.fetched_at.isoformat(),
+        'version': snapshot_version(snapshot),
+        'total_gen': round(snapshot.total_gen, 1),
+        'hud': {k: round(v, 1) for k, v in hud_totals(snapshot.stats, snapshot.total_gen).items()},
+        'stats': {k: round(v, 1) for k, v in snapshot.stats.items()},
+        'mix': [{'category': k, 'color': c, 'pct': round(p, 2)} for k, c, p in legend_items(snapshot.stats, snapshot.total_gen)],
+    }
+
+
+def plants_geojson(snapshot):
+    features = []
+    for key, group in snapshot.plant_groups.items():
+        lat, lon = group['coords']
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+            'properties': {'key': key, 'total_gen': round(group['total_gen'], 1), 'category': group['type'],
+                           'color': group['color'], 'units': group.unit_count},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def units_table(snapshot):
+    units = snapshot.units
+    columns = ('name', 'type', 'gen', 'category', 'plant_key')
+    # 缺值 (例如沒有座標的機組) 輸出成 null，而不是 JSON 不接受的 NaN
+    values = [units[c].astype(object).where(units[c].notna(), None).tolist() for c in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def snapshot_regions(snapshot):
+    def rows(mix):
+        return [{'name': name, 'total': round(row['total'], 1), 'net': round(row['net'], 1),
+                 'mix': {c: round(v, 1) for c, v in row.drop(['total', 'net']).items() if v > 0}}
+                for name, row in mix.iterrows()]
+
+    return {'version': snapshot_version(snapshot), 'regions': rows(regional_mix(snapshot.units)),
+            'zones': rows(regional_mix(snapshot.units, 'zone'))}
+
+
+def snapshot_changes(snapshot, top=CHANGES_TOP):
+    diff = snapshot.diff
+    if diff is None:
+        return {'version': snapshot_version(snapshot), 'base': None, 'minutes': None, 'plants': [], 'units': []}
+
+    def rows(table, columns):
+        table = table[columns].round({c: 2 for c in columns if table[c].dtype.kind == 'f'})
+        return table.astype(object).where(table.notna(), None).to_dict('records')
+
+    return {
+        'version': snapshot_version(snapshot), 'base': diff.base, 'minutes': round(diff.minutes, 2),
+        'plants': rows(diff.movers(top, by='plants').reset_index(), ['plant_key', 'category', 'prev_total', 'total', 'delta', 'ramp', 'switched']),
+        'units': rows(diff.movers(top), ['name', 'category', 'plant_key', 'prev_gen', 'gen', 'delta', 'ramp', 'status', 'switched']),
+    }
+
+
+def build_responses(snapshot):
+    """路徑 -> Response；同一份快照只算一次"""
+    version = snapshot_version(snapshot)
+    bodies = {
+        '/snapshot': (_json(snapshot_summary(snapshot)), 'application/json'),
+        '/plants.geojson': (_json(plants_geojson(snapshot)), 'application/geo+json'),
+        '/units': (_json(units_table(snapshot)), 'application/json'),
+        '/regions': (_json(snapshot_regions(snapshot)), 'application/json'),
+        '/changes': (_json(snapshot_changes(snapshot)), 'application/json'),
+    }
+    return {path: Response(body, f"{ctype}; charset=utf-8", f'"{version}-{path.strip("/")}"')
+            for path, (body, ctype) in bodies.items()}
+
+
+class ApiState:
+    """目前的回應表；新快照進來時整份替換 (讀取端不需要加鎖)"""
+
+    def __init__(self):
+        self.responses = {}
+        self.snapshot = None
+
+    def update(self, snapshot):
+        with timed('api'):
+            responses = build_responses(snapshot)
+        self.responses, self.snapshot = responses, snapshot
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive：牆面看板輪詢時不必每次重新連線
+    disable_nagle_algorithm = True  # 標頭與內容分兩次寫出，不關掉 Nagle 每個請求會多等 40ms
+    state = None
+    max_age = 30
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            self._send(200, REGISTRY.render().encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        response = self.state.responses.get(path)
+        if response is None:
+            if self.state.snapshot is None and path in ('/snapshot', '/plants.geojson', '/units', '/regions', '/changes'):
+                self._send(503, _json({'error': '尚未取得台電資料'}), "application/json; charset=utf-8")
+            else:
+                self._send(404, _json({'error': 'not found'}), "application/json; charset=utf-8")
+            return
+
+        headers = {'ETag': response.etag, 'Cache-Control': f"public, max-age={self.max_age}", 'Vary': 'Accept-Encoding'}
+        if response.etag in (self.headers.get('If-None-Match') or ""):
+            self._send(304, b"", None, headers)
+            return
+        encoding, body = response.pick(self.headers.get('Accept-Encoding'))
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        self._send(200, body, response.content_type, headers)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(poller, host="127.0.0.1", port=8080, max_age=30):
+    """建立 API server (尚未開始服務)；poller 的每份新快照都會更新回應表"""
+    state = ApiState()
+    if poller.snapshot is not None:
+        state.update(poller.snapshot)
+    poller.subscribe(state.update)
+    handler = type("PowermapApiHandler", (ApiHandler,), {'state': state, 'max_age': max_age})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="台灣電力即時資料 JSON/GeoJSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--interval", type=int, default=60, help="向台電抓取的間隔秒數")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    poller = SnapshotPoller(interval=args.interval)
+    server = make_server(poller, args.host, args.port, max_age=max(1, args.interval // 2))
+    poller.start()
+    log.info("API 服務啟動: http://%s:%d/snapshot", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        poller.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
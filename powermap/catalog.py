@@ -0,0 +1,94 @@
+"""電廠座標字典與分類規則 (V9: 抽蓄獨立 & 風光分家)"""
+from .matcher import PlantMatcher
+
+
+# ---------------------------------------------------------
+# 1. 座標字典 (新增苗栗大鵬、桃園觀園)
+# ---------------------------------------------------------
+location_dict = {
+    # === 核能 (Nuclear) ===
+    "核一": [25.289, 121.589], "核二": [25.201, 121.666], "核三": [21.958, 120.752],
+
+    # === 燃煤 (Coal) ===
+    "台中": [24.213, 120.483], "麥寮": [23.793, 120.199], "和平": [24.307, 121.760],
+    "林口": [25.122, 121.298], "大林": [22.535, 120.336], "興達": [22.856, 120.198],
+
+    # === 燃氣 (Gas) ===
+    "大潭": [25.027, 121.047], "通霄": [24.491, 120.675], "協和": [25.155, 121.745],
+    "南部": [22.607, 120.294], "國光": [25.042, 121.341], "新桃": [24.814, 121.197],
+    "海湖": [25.116, 121.278], "長生": [25.116, 121.278],
+    "星元": [24.079, 120.412], "嘉惠": [23.533, 120.475],
+    "森霸": [23.083, 120.366], "豐德": [23.083, 120.366],
+
+    # === 抽蓄/儲能 (Pumped Storage) ===
+    "明潭": [23.839, 120.890], "大觀": [23.837, 120.898],
+
+    # === 一般水力 (Hydro) ===
+    "德基": [24.256, 121.161], "青山": [24.223, 121.139], "谷關": [24.204, 121.082],
+    "天輪": [24.185, 121.026], "馬鞍": [24.175, 120.941], "萬大": [23.977, 121.127],
+    "卓蘭": [24.318, 120.835], "碧海": [24.293, 121.613], "立霧": [24.166, 121.637],
+    "翡翠": [24.903, 121.564], "石門": [24.813, 121.246], "曾文": [23.250, 120.528],
+    "烏山頭": [23.193, 120.460], "粗坑": [24.845, 121.189], "桂山": [24.916, 121.558],
+
+    # === 風力 (Wind) ===
+    # 修正：觀園 (桃園觀音/大園)、大鵬 (苗栗後龍)
+    "觀園": [25.039, 121.060], "觀園風力": [25.039, 121.060],
+    "大鵬": [24.606, 120.735], "大鵬風力": [24.606, 120.735],
+    "石門風力": [25.295, 121.565], "大潭風力": [25.030, 121.045], "蘆竹風力": [25.107, 121.272],
+    "大園風力": [25.077, 121.202], "香山風力": [24.757, 120.909],
+    "台中風力": [24.256, 120.505], "台中港": [24.256, 120.505], "彰工風力": [24.128, 120.422],
+    "王功風力": [23.971, 120.334], "彰濱風力": [24.062, 120.395], "永安風力": [22.822, 120.218],
+    "恆春風力": [21.954, 120.743], "中屯": [23.613, 119.605], "湖西": [23.582, 119.671],
+    "四湖風力": [23.635, 120.225], "雲麥風力": [23.766, 120.231],
+    "GENERIC_WIND": [24.05, 120.30], # 彰化外海示意
+
+    # === 太陽能 (Solar) ===
+    "彰濱光": [24.062, 120.395], "彰濱太陽": [24.062, 120.395],
+    "南鹽光": [23.189, 120.119], "台南鹽田": [23.189, 120.119],
+    "七美": [23.208, 119.428], "望安": [23.369, 119.502],
+    "高訓光": [22.605, 120.310], "豐德光": [23.083, 120.366],
+    "大潭光": [25.027, 121.047], "台中光": [24.213, 120.483],
+    "興達光": [22.856, 120.198], "林口光": [25.122, 121.298],
+    "GENERIC_SOLAR": [23.15, 120.10], # 台南示意
+
+    # === 離島 ===
+    "金門": [24.426, 118.396], "塔山": [24.426, 118.396],
+    "珠山": [26.155, 119.927], "馬祖": [26.155, 119.927],
+    "蘭嶼": [22.036, 121.556], "綠島": [22.663, 121.493]
+}
+
+GENERIC_WIND_KEY = "其他風力(彰化外海示意)"
+GENERIC_SOLAR_KEY = "其他光電(南部示意)"
+
+# ---------------------------------------------------------
+# 2. 分類規則 (依優先權由上而下比對，第一個命中者為準)
+#    (類別, 顏色, 機組類型關鍵字, 機組名稱關鍵字)
+# ---------------------------------------------------------
+STYLE_RULES = (
+    ("抽蓄", "#9932CC", ("抽蓄",), ("明潭", "大觀")),      # Dark Orchid (紫色)
+    ("核能", "yellow", ("核能",), ()),
+    ("風力", "#00FF00", ("風力",), ()),                    # Lime Green (綠)
+    ("太陽能", "#FFA500", ("太陽", "光電"), ()),            # Orange (橙)
+    ("水力", "#00BFFF", ("水力",), ()),                    # Deep Sky Blue (藍)
+    ("燃煤", "#AAAAAA", ("燃煤", "煤"), ()),                # Light Gray (灰)
+    ("燃氣", "#FF4500", ("燃氣", "氣", "LNG"), ()),         # Orange Red (紅)
+    ("燃油", "#A0522D", ("燃油", "輕油", "柴油"), ()),       # Sienna (棕)
+)
+OTHER_CATEGORY, OTHER_COLOR = "其他", "#8B0000"
+
+# 統計容器 (細分風/光/抽蓄)
+STATS_KEYS = ("核能", "燃氣", "燃煤", "燃油", "抽蓄", "水力", "風力", "太陽能")
+
+# 圖例顏色與顯示順序 (基載 -> 中載 -> 尖載/再生)
+color_map = {
+    "核能": "yellow", "燃氣": "#FF4500", "燃煤": "#AAAAAA", "燃油": "#A0522D",
+    "抽蓄": "#9932CC", "水力": "#00BFFF", "風力": "#00FF00", "太陽能": "#FFA500", "其他": "#333333"
+}
+order_keys = ["核能", "燃煤", "燃氣", "燃油", "抽蓄", "水力", "風力", "太陽能"]
+
+
+# 電廠名稱比對器 (模組載入時編譯一次)
+plant_matcher = PlantMatcher(location_dict, fallbacks=(
+    (GENERIC_WIND_KEY, location_dict["GENERIC_WIND"], ("風", "Wind")),
+    (GENERIC_SOLAR_KEY, location_dict["GENERIC_SOLAR"], ("光", "太陽", "Solar")),
+))
@@ -0,0 +1,47 @@
+"""增量地圖更新：快照 -> 精簡地圖狀態，以及兩份狀態之間的 JSON 差異
+
+地圖狀態 (電廠以 plant_groups 的 key 為索引)：
+    plants[key] = [lat, lon, 半徑, 顏色, 類別, 淨發電量, [明細...]]
+    overlay     = HUD 與圖例的 HTML (powermap.overlay 的共用樣板，不含 CSS 與拖曳腳本)
+瀏覽器端保留底圖與上一份狀態，之後只需要套用差異 (變動的圓點，HUD/圖例有變才重送)。
+"""
+from .aggregate import DETAIL_LIMIT
+from .metrics import timed
+from .overlay import overlay_html
+from .render import map_cache, marker_radius, snapshot_version
+
+
+def map_state(snapshot):
+    """同一份快照只算一次 (跨 session 共用)"""
+    version = snapshot_version(snapshot)
+    return map_cache.get_or_compute(('state', version), lambda: _map_state(snapshot, version))
+
+
+@timed('state')
+def _map_state(snapshot, version):
+    plants = {}
+    for key, data in snapshot.plant_groups.items():
+        gen_mw = data['total_gen']
+        lat, lon = data['coords']
+        plants[key] = [lat, lon, round(marker_radius(gen_mw), 2), data['color'], data['type'],
+                       round(gen_mw, 1), list(data['details'][:DETAIL_LIMIT])]
+    overlay = overlay_html(snapshot.stats, snapshot.total_gen, static=False)
+    return {'v': version, 'plants': plants, 'overlay': overlay}
+
+
+def diff_state(old, new):
+    """old -> new 的差異；只列出有變動的電廠，HUD/圖例沒變則省略"""
+    old_plants, new_plants = old['plants'], new['plants']
+    diff = {
+        'base': old['v'], 'v': new['v'],
+        'set': {k: v for k, v in new_plants.items() if old_plants.get(k) != v},
+        'del': [k for k in old_plants if k not in new_plants],
+    }
+    if new['overlay'] != old['overlay']: diff['overlay'] = new['overlay']
+    return diff
+
+
+def cached_diff(old_state, new_state):
+    """兩份狀態之間的差異 (同一組版本只計算一次，所有 session 共用)"""
+    key = ('diff', old_state['v'], new_state['v'])
+    return map_cache.get_or_compute(key, lambda: diff_state(old_state, new_state))
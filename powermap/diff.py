@@ -0,0 +1,156 @@
+"""快照之間的增量比對：依機組名稱對齊前後兩份機組表
+
+兩次更新之間大多數機組不變或只小幅變動。機組清單 (名稱與類型及其順序) 沒變時，
+直接沿用上一份的分類與電廠歸戶，統計、總發電量與電廠合計只就變動的列加減；
+清單有變 (新增/移除機組) 才整份重算，再依名稱對齊算出差異。
+
+SnapshotDiff 提供每台機組與每座電廠的變化量與爬升率 (MW/分)，例如明潭、大觀的
+抽蓄機組在抽水與發電之間切換 (switched)；「變動最大」面板與推送差異都由此而來。
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .aggregate import PlantGroup
+
+REBASE_EVERY = 240   # 連續增量更新這麼多次後整份重算一次，避免浮點誤差累積
+
+UNIT_DIFF_COLUMNS = ['name', 'type', 'category', 'plant_key', 'prev_gen', 'gen', 'delta', 'ramp', 'status', 'switched']
+PLANT_DIFF_COLUMNS = ['category', 'prev_total', 'total', 'delta', 'ramp', 'switched']
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotDiff:
+    units: pd.DataFrame       # 有變動的機組 (UNIT_DIFF_COLUMNS)；status 為 changed / added / removed
+    plants: pd.DataFrame      # 合計有變動的電廠 (index 為電廠鍵值，PLANT_DIFF_COLUMNS)
+    minutes: float            # 兩份快照相隔的分鐘數 (爬升率的分母)
+    incremental: bool = False # True：沿用上一份的分類結果，只更新變動的列
+    chain: int = 0            # 連續增量更新的次數 (到 REBASE_EVERY 時整份重算)
+    base: str = None          # 上一份快照的內容雜湊 (推送差異時的基準版本)
+
+    def movers(self, n=10, by='units'):
+        """依變化量絕對值排序的前 n 名 (by='units' 或 'plants')"""
+        table = self.units if by == 'units' else self.plants
+        return table.iloc[np.argsort(-table['delta'].abs().to_numpy(), kind='stable')[:n]]
+
+    @property
+    def switched(self):
+        """由發電轉抽水 (或反過來) 的機組"""
+        return self.units[self.units['switched']]
+
+
+def elapsed_minutes(previous, units, fetched_at):
+    """兩份快照的間隔：優先用台電的資料時間，沒有時用抓取時間"""
+    try:
+        before, after = (datetime.fromisoformat(u.attrs['data_time']) for u in (previous.units, units))
+        if after > before:
+            return (after - before).total_seconds() / 60
+    except (KeyError, TypeError, ValueError):
+        pass
+    return max((fetched_at - previous.fetched_at).total_seconds() / 60, 1e-9)
+
+
+def _switched(prev_gen, gen):
+    # 一正一負才算切換 (0 是停機，不算)
+    return (prev_gen * gen) < 0
+
+
+def same_layout(prev_units, df):
+    """機組清單 (名稱、類型與順序) 是否與上一份相同"""
+    return (len(prev_units) == len(df)
+            and prev_units['name'].reset_index(drop=True).equals(df['name'].reset_index(drop=True))
+            and prev_units['type'].reset_index(drop=True).equals(df['type'].reset_index(drop=True)))
+
+
+def _unit_keys(names, numbered):
+    # 台電偶爾有同名機組：依出現順序加上序號，讓對齊仍是一對一 (前後兩份要用同一種鍵)
+    if not numbered:
+        return names
+    return names + '#' + names.groupby(names, sort=False).cumcount().astype(str)
+
+
+def _unit_diff(columns, prev_gen, gen, minutes, status):
+    delta = gen - prev_gen
+    return pd.DataFrame({**columns, 'prev_gen': prev_gen, 'gen': gen, 'delta': delta, 'ramp': delta / minutes,
+                         'status': status, 'switched': _switched(prev_gen, gen)})[UNIT_DIFF_COLUMNS]
+
+
+def _plant_diff(keys, prev_groups, groups, minutes, unit_diff):
+    """合計有變動的電廠；消失或新出現的電廠以 0 MW 計"""
+    prev_total = np.array([prev_groups[k].total_gen if k in prev_groups else 0.0 for k in keys], dtype=float)
+    total = np.array([groups[k].total_gen if k in groups else 0.0 for k in keys], dtype=float)
+    switched = set(unit_diff['plant_key'][unit_diff['switched']].tolist())
+    return pd.DataFrame({
+        'category': [(groups.get(k) or prev_groups[k]).type for k in keys],
+        'prev_total': prev_total, 'total': total, 'delta': total - prev_total, 'ramp': (total - prev_total) / minutes,
+        'switched': [k in switched for k in keys],
+    }, index=pd.Index(keys, name='plant_key', dtype=object))
+
+
+def apply_incremental(previous, df, minutes):
+    """機組清單與上一份相同時：沿用分類結果，只就變動的列更新統計與電廠合計
+
+    回傳 (units, stats, total_gen, plant_groups, diff)，結果與整份重算相同 (至多差浮點誤差)。
+    """
+    prev_units = previous.units
+    units = df.assign(category=prev_units['category'].array, color=prev_units['color'].array,
+                      plant_key=prev_units['plant_key'].array)
+    prev_gen = prev_units['gen'].to_numpy(dtype=float)
+    gen = units['gen'].to_numpy(dtype=float)
+    changed = np.flatnonzero(prev_gen != gen)
+    prev_gen, new_gen = prev_gen[changed], gen[changed]
+
+    # 只取變動的列 (通常只占一小部分) 再轉成 Python 物件
+    rows = prev_units.take(changed)
+    columns = {c: rows[c].array for c in ('name', 'type', 'category', 'plant_key')}
+
+    stats = dict(previous.stats)
+    for category, d in zip(columns['category'].tolist(),
+                           (np.clip(new_gen, 0, None) - np.clip(prev_gen, 0, None)).tolist()):
+        stats[category] += d
+    total_gen = previous.total_gen + float(np.clip(new_gen, 0, None).sum() - np.clip(prev_gen, 0, None).sum())
+
+    # 電廠：只有含變動機組的電廠要重算合計；列號不變，PlantGroup 改指向新的機組表
+    totals = {}
+    for key, d in zip(columns['plant_key'].tolist(), (new_gen - prev_gen).tolist()):
+        if key is not None and key == key:
+            totals[key] = totals.get(key, previous.plant_groups[key].total_gen) + d
+    names, gens = units['name'].to_numpy(), units['gen'].to_numpy()
+    plant_groups = {
+        key: PlantGroup(key, g.coords, g.type, g.color, totals.get(key, g.total_gen), g.rows, names, gens)
+        for key, g in previous.plant_groups.items()
+    }
+
+    unit_diff = _unit_diff(columns, prev_gen, new_gen, minutes, 'changed')
+    keys = [k for k in totals if totals[k] != previous.plant_groups[k].total_gen]
+    plant_diff = _plant_diff(keys, previous.plant_groups, plant_groups, minutes, unit_diff)
+    chain = previous.diff.chain + 1 if previous.diff is not None and previous.diff.incremental else 1
+    return units, stats, total_gen, plant_groups, SnapshotDiff(unit_diff, plant_diff, minutes, True, chain, previous.content_hash)
+
+
+def diff_units(previous, units, plant_groups, minutes):
+    """整份重算後的比對：依機組名稱對齊前後兩份機組表 (含新增與移除的機組)"""
+    old_names, new_names = previous.units['name'].astype(str), units['name'].astype(str)
+    numbered = not (old_names.is_unique and new_names.is_unique)
+    old_keys = pd.Index(_unit_keys(old_names, numbered))
+    pos = old_keys.get_indexer(_unit_keys(new_names, numbered))      # 新表每一列在舊表的位置 (-1 為新增)
+    removed = np.setdiff1d(np.arange(len(old_keys)), pos[pos >= 0])
+    prev_gen = np.concatenate([np.where(pos >= 0, previous.units['gen'].to_numpy(dtype=float)[pos], 0.0),
+                               previous.units['gen'].to_numpy(dtype=float)[removed]])
+    gen = np.concatenate([units['gen'].to_numpy(dtype=float), np.zeros(len(removed))])
+    status = np.concatenate([np.where(pos >= 0, 'changed', 'added'), np.full(len(removed), 'removed')]).astype(object)
+    keep = (prev_gen != gen) | (status != 'changed')
+    rows = np.flatnonzero(keep)
+    new_rows, old_rows = rows[rows < len(units)], removed[rows[rows >= len(units)] - len(units)]
+    columns = {c: np.concatenate([units[c].to_numpy()[new_rows], previous.units[c].to_numpy()[old_rows]]).astype(object)
+               for c in ('name', 'type', 'category', 'plant_key')}
+    unit_diff = _unit_diff(columns, prev_gen[keep], gen[keep], minutes, status[keep])
+
+    prev_groups = previous.plant_groups
+    keys = [k for k in dict.fromkeys([*plant_groups, *prev_groups])
+            if (plant_groups[k].total_gen if k in plant_groups else 0.0)
+            != (prev_groups[k].total_gen if k in prev_groups else 0.0)]
+    plant_diff = _plant_diff(keys, prev_groups, plant_groups, minutes, unit_diff)
+    return SnapshotDiff(unit_diff, plant_diff, minutes, base=previous.content_hash)
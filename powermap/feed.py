@@ -0,0 +1,278 @@
+"""台電 001.json (各機組發電量) 下載與解析"""
+import codecs
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import tarfile
+import zipfile
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import payload_bytes, timed, upstream_responses
+
+try:
+    import orjson   # 選用：有安裝就用較快的 JSON 解析
+except ImportError:
+    orjson = None
+
+# 可用環境變數改指向回放伺服器 (見 benchmarks/replay_server.py)
+FEED_URL = os.environ.get("POWERMAP_FEED_URL", "https://service.taipower.com.tw/data/opendata/apply/file/d006001/001.json")
+
+# 欄位對應 (完整名稱優先，其次以關鍵字容錯)
+target_cols = {'機組名稱': 'name', '機組類型': 'type', '淨發電量(MW)': 'gen'}
+
+BOM = codecs.BOM_UTF8
+STREAM_THRESHOLD = 8 * 1024 * 1024   # 超過 8MB 的內容改走串流解析 (台電即時資料約 50KB)
+
+
+def field_keys(keys):
+    """原始欄位名稱 -> {'name': ..., 'type': ..., 'gen': ...} (完整名稱優先，其次以關鍵字容錯)"""
+    found = {}
+    for col in keys:
+        if col in target_cols: found[target_cols[col]] = col
+    for col in keys:
+        if "名稱" in col: found.setdefault('name', col)
+        elif "類型" in col: found.setdefault('type', col)
+        elif "淨發電量" in col and "比" not in col: found.setdefault('gen', col)
+    return found
+
+
+def _strip_bom(content):
+    """去掉 UTF-8 BOM；有 orjson 時用 memoryview 切片 (不複製)"""
+    if content[:3] == BOM:
+        return memoryview(content)[3:] if orjson is not None else content[3:]
+    return content
+
+
+def decode_payload(content):
+    """bytes -> JSON 物件 (orjson 優先，沒有則用標準庫)"""
+    content = _strip_bom(content)
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class _Columns:
+    """逐筆累加 name / type / gen 三個欄位，不保留整筆機組 dict"""
+
+    def __init__(self):
+        self.keys = None
+        self.name, self.type, self.gen = [], [], []
+
+    def add(self, record):
+        if self.keys is None:
+            # 台電每筆機組的欄位都一樣，由第一筆決定欄位對應
+            keys = field_keys(record.keys())
+            self.keys = (keys.get('name'), keys.get('type'), keys.get('gen'))
+        name, p_type, gen = self.keys
+        self.name.append(record.get(name))
+        self.type.append(record.get(p_type))
+        self.gen.append(record.get(gen))
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def frame(self, data_time=None):
+        gen = pd.to_numeric(pd.Series(self.gen, dtype=object), errors='coerce').fillna(0).astype(float)
+        df = pd.DataFrame({'name': self.name, 'type': self.type, 'gen': gen.to_numpy()})
+        # 台電在 "" 欄位放資料時間 (例如 "2024-01-01 12:30")，批次/回放模式會用到
+        if data_time:
+            df.attrs['data_time'] = data_time
+        return df
+
+
+def units_frame(data):
+    """decode_payload() 的結果 -> 機組表 (只取 name / type / gen 三欄)"""
+    records = data['aaData'] if isinstance(data, dict) and 'aaData' in data else data
+    data_time = data.get('') if isinstance(data, dict) else None
+    return _Columns().extend(records).frame(data_time)
+
+
+def parse_units(content):
+    """bytes -> 機組表 (name / type / gen)，容許 UTF-8 BOM；超過 STREAM_THRESHOLD 改走串流解析"""
+    if len(content) > STREAM_THRESHOLD:
+        return read_units(io.BytesIO(content))
+    with timed('decode'):
+        data = decode_payload(content)
+    with timed('frame'):
+        return units_frame(data)
+
+
+# ---------------------------------------------------------
+# 串流解析：逐筆解碼 aaData，適合很大的檔案或大量歷史封存
+# ---------------------------------------------------------
+_DATA_TIME = re.compile(r'""\s*:\s*"([^"]*)"')
+
+
+def iter_records(fp, chunk_size=1 << 20):
+    """由檔案物件逐筆產生 aaData 內的機組 dict；回傳值 (StopIteration.value) 為資料時間"""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buf, pos, outside, state = "", 0, [], 'head'
+    while True:
+        chunk = fp.read(chunk_size)
+        final = not chunk
+        buf = buf[pos:] + text_decoder.decode(chunk, final)
+        pos = 0
+        if state == 'head':
+            # 找到 aaData 陣列的開頭 (或整份就是一個陣列)
+            stripped = buf.lstrip()
+            start = 0 if stripped.startswith('[') else buf.find('"aaData"')
+            bracket = buf.find('[', start) if start >= 0 else -1
+            if bracket < 0:
+                if final:
+                    raise ValueError("找不到 aaData 陣列")
+                continue
+            outside.append(buf[:bracket])
+            pos, state = bracket + 1, 'items'
+        while state == 'items':
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == ']':
+                state, pos = 'tail', pos + 1
+                break
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                break   # 這一筆還沒讀完，等下一塊
+            yield record
+            pos = end
+        if state == 'tail':
+            outside.append(buf[pos:])
+            pos = len(buf)
+        if final:
+            if state != 'tail':
+                raise ValueError("aaData 陣列不完整")
+            match = _DATA_TIME.search("".join(outside))
+            return match.group(1) if match else None
+
+
+def read_units(fp, chunk_size=1 << 20):
+    """檔案物件 -> 機組表；不把整份 JSON 或所有機組 dict 同時放在記憶體裡"""
+    columns = _Columns()
+    records = iter_records(fp, chunk_size)
+    with timed('decode'):
+        while True:
+            try:
+                columns.add(next(records))
+            except StopIteration as stop:
+                data_time = stop.value
+                break
+    with timed('frame'):
+        return columns.frame(data_time)
+
+
+def iter_recorded(path):
+    """錄下來的 001.json (資料夾 / zip / tar)：依名稱排序產生 (名稱, 原始 bytes)"""
+    if os.path.isdir(path):
+        for p in sorted(glob.glob(os.path.join(path, "**", "*.json"), recursive=True)):
+            with open(p, 'rb') as f:
+                yield os.path.relpath(p, path), f.read()
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for name in sorted(n for n in zf.namelist() if n.endswith(".json")):
+                yield name, zf.read(name)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as tf:
+            members = sorted((m for m in tf.getmembers() if m.isfile() and m.name.endswith(".json")), key=lambda m: m.name)
+            for member in members:
+                yield member.name, tf.extractfile(member).read()
+    else:
+        raise ValueError(f"無法辨識的快照來源: {path}")
+
+
+def make_session(pool_size=4, hosts=1, verify=False):
+    """共用連線池的 Session；verify 預設關閉只是為了台電的憑證，其他網站請傳 verify=True"""
+    session = requests.Session()
+    session.verify = verify
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class FeedClient:
+    """持續連線 + 條件式請求 + 內容雜湊比對的 001.json 抓取器
+
+    load() 只在內容真的變了才解析；304 或雜湊相同時回傳 None，
+    呼叫端即可略過 JSON 解析、DataFrame 建構與彙總。
+    parse 可換成其他解析函式 (例如 decode_payload)，用來抓其他開放資料檔。
+    """
+
+    def __init__(self, url=FEED_URL, timeout=(5, 20), session=None, parse=parse_units):
+        self.url = url
+        self.timeout = timeout            # (connect, read) 秒
+        self.session = session or make_session()
+        self.parse = parse
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self.last_status = None
+        self._staged = None               # 新內容的 (ETag, Last-Modified, 雜湊)，等 commit() 才記住
+
+    def fetch(self):
+        """送出條件式請求；304 時回傳 None"""
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        try:
+            with timed('download'):
+                response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            upstream_responses.inc('error')
+            raise
+        self.last_status = response.status_code
+        upstream_responses.inc(str(response.status_code))
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return response
+
+    def load(self):
+        """回傳 (機組表 (parse 的結果), 內容雜湊)；資料未變更時回傳 None
+
+        新內容的驗證資訊與雜湊先暫存，呼叫端用它建好快照後才 commit()；
+        沒有 commit 的內容下一次會重新下載、重新解析，不會被當成「未變更」。
+        """
+        response = self.fetch()
+        if response is None:
+            return None
+        content = response.content
+        payload_bytes.observe(len(content))
+        # 雜湊去掉 BOM 後的內容：只是多了/少了 BOM 不算新資料
+        digest = hashlib.blake2b(_strip_bom(content), digest_size=16).hexdigest()
+        validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        if digest == self.content_hash:
+            # 與已交出的內容相同：直接記住新的驗證資訊
+            self.etag, self.last_modified = validators
+            self._staged = None
+            return None
+        units = self.parse(content)
+        self._staged = (*validators, digest)
+        return units, digest
+
+    def commit(self, digest=None):
+        """load() 交出的新內容已經用上 (快照已發布)：記住它的驗證資訊與雜湊
+
+        指定 digest 時只在暫存的內容就是它時才記住 (避免記到還沒交出去的另一份內容)。
+        """
+        staged = self._staged
+        if staged is None or (digest is not None and staged[2] != digest):
+            return
+        self.etag, self.last_modified, self.content_hash = staged
+        self._staged = None
+
+
+def fetch_units(url=FEED_URL):
+    return FeedClient(url).load()[0]
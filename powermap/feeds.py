@@ -0,0 +1,232 @@
+"""多個台電開放資料檔的並行抓取：共用連線池、各自逾時、抖動退避與斷路器
+
+    units  001.json      各機組發電量 (必要；快照以它為主)
+    load   loadpara.json 目前負載、供電能力與備轉容量率 (附屬資料)
+
+每一輪以 asyncio 同時送出所有請求 (requests 的阻塞呼叫交給執行緒池，共用同一個 Session
+連線池)；機組表一回來這一輪就結束，不等附屬資料：還沒回來的附屬資料照常在背景完成，
+下一輪再併進快照。單一資料來源逾時或失敗只影響它自己：依指數退避 (含隨機抖動) 延後重試，
+連續失敗達門檻就斷路一段時間，期間沿用上一份成功的內容。上一輪還沒回來的請求不會重送。
+
+一輪結束後交給 SnapshotPoller 的是 (機組表, 內容雜湊, 附屬資料)，快照 (Snapshot.feeds)
+是一份前後一致的一整包；SnapshotPoller 發布快照後呼叫 commit()，抓取器才記住這份內容
+(快照沒建成就會在下一輪重新下載、重新解析)。附屬資料來源可用環境變數設定：
+
+    POWERMAP_EXTRA_FEEDS="load=https://.../loadpara.json,other=https://.../x.json"   (設為空字串關閉)
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from .feed import FEED_URL, FeedClient, decode_payload, make_session, parse_units
+from .metrics import feed_results
+
+log = logging.getLogger(__name__)
+
+LOAD_URL = "https://www.taipower.com.tw/d006/loadGraph/loadGraph/data/loadpara.json"
+PRIMARY = 'units'
+
+
+@dataclass(frozen=True)
+class FeedSpec:
+    name: str
+    url: str
+    parse: object = decode_payload     # bytes -> 內容
+    timeout: tuple = (5, 20)           # requests 的 (connect, read) 秒
+    deadline: float = 25               # 這一輪最多等它幾秒 (超過就先沿用舊資料)
+
+
+def extra_feeds(env=None):
+    """由 POWERMAP_EXTRA_FEEDS ("名稱=網址,...") 讀出附屬資料來源；未設定時為 load"""
+    value = os.environ.get("POWERMAP_EXTRA_FEEDS") if env is None else env
+    if value is None:
+        return [FeedSpec('load', LOAD_URL)]
+    specs = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, url = item.partition('=')
+        specs.append(FeedSpec(name.strip(), url.strip()))
+    return specs
+
+
+def default_feeds():
+    return [FeedSpec(PRIMARY, FEED_URL, parse_units), *extra_feeds()]
+
+
+class CircuitBreaker:
+    """連續失敗 threshold 次就斷路 reset_after 秒；時間到放行一次試探 (half-open)，成功才恢復"""
+
+    def __init__(self, threshold=5, reset_after=300):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self, now):
+        if self.state == 'open' and now - self.opened_at >= self.reset_after:
+            self.state = 'half-open'
+        return self.state != 'open'
+
+    def success(self):
+        self.state, self.failures, self.opened_at = 'closed', 0, None
+
+    def failure(self, now):
+        self.failures += 1
+        if self.state == 'half-open' or self.failures >= self.threshold:
+            self.state, self.opened_at = 'open', now
+
+
+def backoff_delay(failures, base=5, cap=300):
+    """第 failures 次失敗後的等待秒數：指數成長，取上限後在 [d/2, d] 之間隨機 (避免同時重試)"""
+    delay = min(cap, base * 2 ** max(failures - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class FeedState:
+    """單一資料來源的狀態：條件式請求的抓取器、最後一份成功的內容、退避與斷路器"""
+
+    def __init__(self, spec, session, breaker):
+        self.spec = spec
+        self.client = FeedClient(spec.url, spec.timeout, session, parse=spec.parse)
+        self.breaker = breaker
+        self.value = None           # 最後一份成功解析的內容
+        self.content_hash = None    # value 的內容雜湊
+        self.fresh = False          # value 是新的、還沒交出去 (機組表交出後即釋放)
+        self.updated_at = None      # 內容最後一次變更的時間 (epoch 秒)
+        self.checked_at = None      # 最後一次成功向上游確認 (含未變更)
+        self.last_error = None
+        self.retry_at = 0.0         # 退避：在這之前不再送請求
+        self.pending = None         # 執行中的請求 (concurrent.futures.Future)
+        self.lock = threading.Lock()
+
+
+class MultiFeedFetcher:
+    def __init__(self, specs=None, breaker_threshold=5, breaker_reset=300, backoff_base=5, backoff_cap=300):
+        specs = list(specs or default_feeds())
+        if not specs or specs[0].name != PRIMARY:
+            raise ValueError(f"第一個資料來源必須是 {PRIMARY!r} (機組發電量)")
+        hosts = len({urlsplit(s.url).netloc for s in specs})
+        self.session = make_session(pool_size=len(specs), hosts=hosts)
+        self.executor = ThreadPoolExecutor(max_workers=len(specs), thread_name_prefix="feed")
+        self.backoff = (backoff_base, backoff_cap)
+        self.feeds = {s.name: FeedState(s, self.session, CircuitBreaker(breaker_threshold, breaker_reset)) for s in specs}
+        self.content_hash = None    # 機組表最後一次交出去 (已 commit) 的雜湊
+        self._version = None        # 附屬資料最後一次交出去的版本
+        self._staged = None         # load() 交出、還沒 commit 的 (雜湊, 版本)
+
+    def _load(self, state):
+        """在執行緒池裡執行：抓取並更新該資料來源的狀態；回傳結果代碼"""
+        try:
+            result = state.client.load()
+        except Exception as e:
+            now = time.time()
+            state.breaker.failure(now)
+            state.last_error = e
+            state.retry_at = now + backoff_delay(state.breaker.failures, *self.backoff)
+            log.warning("資料來源 %s 抓取失敗 (連續 %d 次): %s", state.spec.name, state.breaker.failures, e)
+            return 'error'
+        now = time.time()
+        state.breaker.success()
+        state.last_error, state.retry_at, state.checked_at = None, 0.0, now
+        if result is None:
+            return 'unchanged'
+        if state.spec.name != PRIMARY:
+            state.client.commit()   # 附屬資料解析成功就算用上；機組表要等快照發布 (見 commit())
+        with state.lock:
+            state.value, state.content_hash, state.fresh, state.updated_at = result[0], result[1], True, now
+        return 'new'
+
+    async def _fetch_one(self, state, now):
+        """送出一個資料來源的請求，最多等 deadline 秒；回傳結果代碼"""
+        if state.pending is not None and not state.pending.done():
+            return 'busy'           # 上一輪的請求還沒回來：不重送，也不等它
+        if not state.breaker.allow(now):
+            return 'open'
+        if now < state.retry_at:
+            return 'wait'
+        state.pending = self.executor.submit(self._load, state)
+        waiter = asyncio.wrap_future(state.pending)
+        # 逾時或這一輪先結束都只是不再等它：不可 cancel waiter (會連帶取消還在排隊的請求)，
+        # 請求照常在背景完成，結果 (fresh) 留給下一輪
+        done, _ = await asyncio.wait({waiter}, timeout=state.spec.deadline)
+        if not done:
+            return 'timeout'
+        return waiter.result()
+
+    async def fetch_all(self):
+        """同時抓取所有資料來源，機組表一回來就結束這一輪；回傳 {名稱: 結果代碼}
+
+        到那時還沒回來的附屬資料記為 'late'，請求照常在背景完成，下一輪再交出去。
+        """
+        now = time.time()
+        tasks = {name: asyncio.ensure_future(self._fetch_one(state, now)) for name, state in self.feeds.items()}
+        await asyncio.wait({tasks[PRIMARY]})
+        results = {}
+        for name, task in tasks.items():
+            if task.done():
+                results[name] = task.result()
+            else:
+                task.cancel()
+                results[name] = 'late'
+            feed_results.inc(name, results[name])
+        return results
+
+    def load(self):
+        """SnapshotPoller 用：(機組表或 None, 內容雜湊, 附屬資料)；全部都沒變時回傳 None
+
+        機組表這一輪沒有成功確認 (失敗、逾時、退避或斷路中) 時拋出例外，由 SnapshotPoller
+        記錄並照常重試；附屬資料失敗只記在各自的狀態裡，快照沿用它上一份成功的內容。
+        交出的內容要等 commit() 才算數。
+        """
+        results = asyncio.run(self.fetch_all())
+        primary = self.feeds[PRIMARY]
+        with primary.lock:
+            units, content_hash = (primary.value, primary.content_hash) if primary.fresh else (None, self.content_hash)
+            primary.value, primary.fresh = None, False    # 機組表交出去後就不再由抓取器持有
+        if units is None and results[PRIMARY] != 'unchanged':
+            raise primary.last_error or TimeoutError(f"{PRIMARY}: {results[PRIMARY]}")
+
+        extras = {n: s.value for n, s in self.feeds.items() if n != PRIMARY and s.value is not None}
+        version = tuple((n, self.feeds[n].updated_at) for n in sorted(extras))
+        if units is None and (version == self._version or self.content_hash is None):
+            return None
+        self._staged = (content_hash, version)
+        return units, content_hash, extras
+
+    def commit(self):
+        """SnapshotPoller 發布快照後呼叫：記住 load() 交出的機組表雜湊 (含 ETag) 與附屬資料版本"""
+        if self._staged is None:
+            return
+        self.content_hash, self._version = self._staged
+        self._staged = None
+        self.feeds[PRIMARY].client.commit(self.content_hash)
+
+    def status(self):
+        """各資料來源的狀態 (除錯面板用)"""
+        now = time.time()
+        return [{
+            'feed': name, 'state': s.breaker.state, 'failures': s.breaker.failures,
+            'age': None if s.checked_at is None else now - s.checked_at,
+            'retry_in': max(0.0, s.retry_at - now), 'error': None if s.last_error is None else str(s.last_error),
+        } for name, s in self.feeds.items()]
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+def load_summary(data):
+    """loadpara.json -> {目前負載, 使用率, 預估尖峰備轉容量率, ...} (欄位缺漏時略過)"""
+    records = data.get('records') if isinstance(data, dict) else data
+    record = records[0] if isinstance(records, list) and records and isinstance(records[0], dict) else {}
+    fields = {
+        'curr_load': '目前用電量', 'curr_util_rate': '目前使用率', 'fore_maxi_sply_capacity': '預估最高供電能力',
+        'fore_peak_dema_load': '預估瞬時尖峰負載', 'fore_peak_resv_rate': '預估尖峰備轉容量率', 'publish_time': '更新時間',
+    }
+    return {label: record[key] for key, label in fields.items() if record.get(key) not in (None, "")}
@@ -0,0 +1,164 @@
+"""快照歷史資料：磁碟上的 Parquet 分區 + 記憶體環狀緩衝區
+
+每份快照的機組表 (ts / name / type / gen / category / plant_key) 先寫成一個小檔：
+    <root>/date=YYYY-MM-DD/snap-HHMMSS-<hash>.parquet
+整點過後 (跨過整點的第一筆寫入時) 把前一個小時的小檔合併成 hour-HH.parquet (依 ts 排序)，
+數週的分鐘資料 (數百萬列) 也只有每天 24 個檔案。合併檔先寫到暫存檔再改名，
+換檔 (改名 + 刪除小檔) 與查詢讀檔互斥，查詢不會讀到一半被刪掉或重複的檔案。查詢時先依日期分區挑檔，
+再交給 pyarrow.dataset 做欄位投影與條件下推；最近的資料直接由記憶體回應。
+"""
+import glob
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .metrics import timed
+from .regions import region_totals
+from .snapshot import TW_TZ
+
+SCHEMA = pa.schema([
+    ('ts', pa.timestamp('ms', tz='UTC')),
+    ('name', pa.string()),
+    ('type', pa.string()),
+    ('gen', pa.float64()),
+    ('category', pa.string()),
+    ('plant_key', pa.string()),
+])
+COLUMNS = SCHEMA.names
+
+
+def snapshot_table(snapshot):
+    units = snapshot.units
+    n = len(units)
+    ts = pd.Timestamp(snapshot.fetched_at).tz_convert('UTC')
+    return pa.table({
+        'ts': pa.array([ts] * n, SCHEMA.field('ts').type),
+        'name': pa.array(units['name'].astype(str), pa.string(), from_pandas=True),
+        'type': pa.array(units['type'].astype(str), pa.string(), from_pandas=True),
+        'gen': pa.array(units['gen'].to_numpy(dtype=float), pa.float64()),
+        'category': pa.array(units['category'], pa.string(), from_pandas=True),
+        'plant_key': pa.array(units['plant_key'], pa.string(), from_pandas=True),
+    }, schema=SCHEMA)
+
+
+def _to_utc(t):
+    t = pd.Timestamp(t)
+    return (t.tz_localize(TW_TZ) if t.tzinfo is None else t).tz_convert('UTC')
+
+
+class HistoryStore:
+    def __init__(self, root, ring_size=180):
+        self.root = root
+        self.ring = deque(maxlen=ring_size)   # [(ts, pa.Table), ...] 最近的快照
+        self._lock = threading.Lock()
+        self._files_lock = threading.Lock()   # 換檔與查詢讀檔互斥
+        self._compacted = None                # 已合併到哪個整點 (之前的小時都已合併)
+        os.makedirs(root, exist_ok=True)
+        self.compact()
+
+    # --- 寫入 ---
+    @timed('history')
+    def append(self, snapshot):
+        table = snapshot_table(snapshot)
+        ts = _to_utc(snapshot.fetched_at)
+        local = ts.tz_convert(TW_TZ)
+        part = os.path.join(self.root, f"date={local:%Y-%m-%d}")
+        os.makedirs(part, exist_ok=True)
+        name = f"snap-{local:%H%M%S}-{(snapshot.content_hash or 'nohash')[:8]}.parquet"
+        tmp = os.path.join(part, f".{name}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, os.path.join(part, name))
+        with self._lock:
+            self.ring.append((ts, table))
+        hour = local.replace(minute=0, second=0, microsecond=0)
+        if self._compacted is None or hour > self._compacted:
+            self.compact(before=hour)
+
+    def compact(self, before=None):
+        """把 before (預設：現在) 所在小時以前的小檔合併成每小時一個檔案"""
+        before = (before or datetime.now(TW_TZ)).replace(minute=0, second=0, microsecond=0)
+        self._compacted = before
+        groups = {}
+        for path in glob.glob(os.path.join(self.root, "date=*", "snap-*.parquet")):
+            date = os.path.basename(os.path.dirname(path))[5:]
+            hour = os.path.basename(path)[5:7]
+            slot = TW_TZ.localize(datetime.strptime(f"{date} {hour}", "%Y-%m-%d %H"))
+            if slot < before:
+                groups.setdefault((os.path.dirname(path), hour), []).append(path)
+
+        for (part, hour), paths in groups.items():
+            target = os.path.join(part, f"hour-{hour}.parquet")
+            tables = [pq.read_table(p, schema=SCHEMA) for p in paths]
+            if os.path.exists(target):
+                tables.insert(0, pq.read_table(target, schema=SCHEMA))
+            merged = pa.concat_tables(tables).sort_by('ts')
+            tmp = os.path.join(part, f".hour-{hour}.parquet.tmp")
+            pq.write_table(merged, tmp, row_group_size=64 * 1024)
+            with self._files_lock:
+                os.replace(tmp, target)
+                for p in paths:
+                    os.remove(p)
+
+    # --- 查詢 ---
+    def _files(self, start, end):
+        files = []
+        day = start.tz_convert(TW_TZ).date()
+        while day <= end.tz_convert(TW_TZ).date():
+            part = os.path.join(self.root, f"date={day:%Y-%m-%d}")
+            files += sorted(glob.glob(os.path.join(part, "*.parquet")))
+            day += timedelta(days=1)
+        return files
+
+    def query(self, start, end=None, plants=None, categories=None, columns=None):
+        """[start, end] 之間的機組資料 (pa.Table)；可依電廠或類別過濾"""
+        start = _to_utc(start)
+        end = _to_utc(end or datetime.now(TW_TZ))
+        columns = columns or COLUMNS
+        expr = (ds.field('ts') >= start) & (ds.field('ts') <= end)
+        if plants is not None:
+            expr &= ds.field('plant_key').isin(list(plants))
+        if categories is not None:
+            expr &= ds.field('category').isin(list(categories))
+
+        # 整段都落在記憶體緩衝區內：不必碰磁碟
+        with self._lock:
+            recent = list(self.ring)
+        if recent and recent[0][0] <= start:
+            tables = [t for ts, t in recent if start <= ts <= end]
+            if not tables:
+                return SCHEMA.empty_table().select(columns)
+            return ds.dataset(pa.concat_tables(tables)).to_table(filter=expr, columns=columns)
+
+        with self._files_lock:
+            files = self._files(start, end)
+            if not files:
+                return SCHEMA.empty_table().select(columns)
+            return ds.dataset(files, schema=SCHEMA, format='parquet').to_table(filter=expr, columns=columns)
+
+    def series(self, start, end=None, by='category', plants=None, categories=None):
+        """時間序列 (index=ts, columns=類別、電廠或區域)：
+        by='category' 加總正向發電量 (同 stats)，by='plant_key' 加總淨發電量 (含抽水負值)，
+        by='region' / 'zone' 依電廠所在區域加總正向發電量 (見 powermap.regions)"""
+        if by in ('region', 'zone'):
+            df = self.query(start, end, plants=plants, categories=categories, columns=['ts', 'gen', 'plant_key']).to_pandas()
+            if df.empty:
+                return pd.DataFrame()
+            wide = region_totals(df, by='ts', level=by)
+            wide.index = wide.index.tz_convert(TW_TZ)
+            return wide
+
+        table = self.query(start, end, plants=plants, categories=categories, columns=['ts', 'gen', by])
+        df = table.to_pandas()
+        if df.empty:
+            return pd.DataFrame()
+        if by == 'category':
+            df['gen'] = df['gen'].clip(lower=0)
+        wide = df.groupby(['ts', by], sort=True)['gen'].sum().unstack(fill_value=0)
+        wide.index = wide.index.tz_convert(TW_TZ)
+        return wide
@@ -0,0 +1,39 @@
+"""增量更新地圖元件：底圖、HUD 與圖例外框只送一次，之後每次只推送差異
+
+每個 session 記住上次送出的地圖狀態；下一次只送 delta.cached_diff() 的結果
+(幾 KB)，瀏覽器端保留縮放與平移位置、不重新載入圖磚。
+瀏覽器手上的版本對不上時 (例如 iframe 重新載入)，元件會回報 resync，
+下一輪改送完整狀態。
+"""
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from .delta import cached_diff, map_state
+from .overlay import OVERLAY_STATIC
+from .tiles import browser_tiles
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "livemap")
+_live_map = components.declare_component("live_map", path=_FRONTEND_DIR)
+
+TILES_URL, TILES_ATTR = browser_tiles()   # 有設定本機圖磚代理時指向它 (見 powermap.tiles)
+
+
+def live_map(snapshot, height=750, key="live_map"):
+    state = map_state(snapshot)
+    sent_key, resync_key = f"_{key}_sent", f"_{key}_resync"
+    reply = st.session_state.get(key) or {}
+    sent = st.session_state.get(sent_key)
+
+    if sent is None or reply.get('resync', 0) != st.session_state.get(resync_key, 0):
+        payload = dict(state, full=True)
+        st.session_state[resync_key] = reply.get('resync', 0)
+    else:
+        payload = cached_diff(sent, state)
+    st.session_state[sent_key] = state
+
+    # 圖例的 CSS 與拖曳腳本 (與其他地圖共用) 只隨完整狀態送一次
+    static = OVERLAY_STATIC if payload.get('full') else None
+    return _live_map(payload=payload, static=static, tiles=TILES_URL, attr=TILES_ATTR, height=height, key=key,
+                     default=None)
@@ -0,0 +1,56 @@
+"""電廠名稱比對器 (預先編譯 + 快取)
+
+所有電廠鍵值在建構時編成單一 alternation regex，依長度由長到短排列，
+因此比對策略明確為「最左、最長」：'大潭風力#1' 會對到「大潭風力」而不是「大潭」，
+不再取決於 location_dict 的鍵值順序。
+機組名稱在快照之間幾乎不變，比對結果以有上限的 LRU 快取保存。
+"""
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+_STRIP = str.maketrans("", "", "() ")
+
+
+class PlantMatcher:
+    def __init__(self, locations, fallbacks=(), cache_size=4096):
+        # locations: {電廠鍵值: [lat, lon]}
+        # fallbacks: [(電廠鍵值, [lat, lon], 機組類型關鍵字), ...] 依序嘗試的模糊歸戶
+        self.locations = locations
+        self.fallbacks = tuple(fallbacks)
+        self.cache_size = cache_size
+        keys = sorted((k for k in locations if not k.startswith("GENERIC_")), key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(k) for k in keys))
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+        self._unmatched = {}
+
+    def _match(self, name):
+        # 回傳名稱中最左、最長的電廠鍵值 (找不到為 None)
+        m = self._pattern.search(name.translate(_STRIP))
+        return m.group(0) if m else None
+
+    def resolve(self, name, p_type):
+        """回傳 (座標, 電廠鍵值)；無法定位時回傳 (None, name)"""
+        key = self.match(name)
+        if key is not None:
+            return self.locations[key], key
+
+        # 模糊歸戶 (並記錄下來供檢查座標字典缺漏)
+        ft = str(p_type)
+        for fallback_key, coords, words in self.fallbacks:
+            if any(w in ft for w in words):
+                self._note_unmatched(name, fallback_key)
+                return coords, fallback_key
+        self._note_unmatched(name, None)
+        return None, name
+
+    def _note_unmatched(self, name, fallback_key):
+        if name in self._unmatched or len(self._unmatched) < self.cache_size:
+            self._unmatched[name] = fallback_key
+
+    def unmatched_report(self):
+        """{歸戶鍵值 (None 為未定位): [機組名稱, ...]}"""
+        report = defaultdict(list)
+        for name, fallback_key in self._unmatched.items():
+            report[fallback_key].append(name)
+        return {k: sorted(v) for k, v in report.items()}
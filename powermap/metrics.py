@@ -0,0 +1,211 @@
+"""各階段耗時與資源的量測 (Prometheus 文字格式)
+
+不依賴 prometheus_client：行程內一個 REGISTRY，提供 Counter / Histogram 與
+「查詢當下才計算」的 callback 指標 (例如快照年齡、快取命中數)。
+serve() 在背景執行緒開一個只回應 /metrics 的本機 HTTP 端點。
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+# 秒：下載/渲染落在 0.1~10 秒，分類/彙總落在毫秒級
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    pairs = ",".join(f'{n}="{esc(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _num(v):
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        items = self.values().items()
+        return [(self.name, _labels(self.labelnames, k), v) for k, v in sorted(items)]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}     # labels -> [各桶次數..., 總和, 次數]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def summary(self):
+        """{labels: {'count', 'sum', 'p50', 'p95'}}；分位數以桶上界估計"""
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        out = {}
+        for labels, s in series.items():
+            counts, total, n = s[:-2], s[-2], s[-1]
+            out[labels] = {'count': n, 'sum': total,
+                           'p50': self._quantile(counts, n, 0.5), 'p95': self._quantile(counts, n, 0.95)}
+        return out
+
+    def _quantile(self, counts, n, q):
+        acc = 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            acc += c
+            if acc >= q * n:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, s in series:
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), s[:-2]):
+                acc += c
+                lines.append((self.name + "_bucket", _labels(names, labels + (_num(bound),)), acc))
+            lines.append((self.name + "_sum", _labels(self.labelnames, labels), s[-2]))
+            lines.append((self.name + "_count", _labels(self.labelnames, labels), s[-1]))
+        return lines
+
+
+class Callback:
+    """查詢時才呼叫 fn()；fn 回傳數字、None (略過) 或 {標籤值 tuple: 數字}"""
+
+    def __init__(self, name, help, fn, kind="gauge", labelnames=()):
+        self.name, self.help, self.fn, self.kind, self.labelnames = name, help, fn, kind, tuple(labelnames)
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            log.exception("指標計算失敗: %s", self.name)
+            return []
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [(self.name, _labels(self.labelnames, k), v) for k, v in sorted(value.items()) if v is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # 同名指標重複註冊時沿用第一個 (Streamlit 重跑 script 時模組不會重載，但 callback 可能重綁)
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, kind="gauge", labelnames=()):
+        """註冊 (或取代) 查詢時才計算的指標"""
+        with self._lock:
+            self._metrics[name] = Callback(name, help, fn, kind, labelnames)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = []
+        for m in metrics:
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(f"{name}{labels} {_num(v)}" for name, labels, v in m.samples())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+stage_seconds = REGISTRY.histogram(
+    "powermap_stage_seconds", "各處理階段耗時 (download/decode/frame/classify/aggregate/render/...)", ("stage",))
+payload_bytes = REGISTRY.histogram(
+    "powermap_payload_bytes", "台電開放資料回應大小", buckets=SIZE_BUCKETS)
+upstream_responses = REGISTRY.counter(
+    "powermap_upstream_responses_total", "台電回應 (依 HTTP 狀態碼；error 表示連線失敗)", ("status",))
+poll_results = REGISTRY.counter(
+    "powermap_poll_total", "背景抓取結果 (new/unchanged/error)", ("result",))
+feed_results = REGISTRY.counter(
+    "powermap_feed_total", "各資料來源每一輪的結果 (new/unchanged/error/timeout/late/busy/wait/open)", ("feed", "result"))
+tile_requests = REGISTRY.counter(
+    "powermap_tile_requests_total", "底圖圖磚代理的請求 (hit/fetched/missing/error)", ("result",))
+
+
+def timed(stage):
+    """with timed('decode'): ... -> powermap_stage_seconds{stage="decode"}"""
+    return stage_seconds.time(stage)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """在背景執行緒提供 http://host:port/metrics；回傳 server (shutdown() 可關閉)"""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="powermap-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,165 @@
+"""地圖上的 HUD 數據列與可拖曳圖例 (app.py 的各種地圖、增量地圖元件與 appv9.py 批次/靜態地圖共用)
+
+版面、CSS 與拖曳腳本都是固定的，模組載入時編譯成樣板一次；每份快照只算出一份很小的
+數值內容 (OverlayPayload：HUD 數字、圖例百分比與圓餅分段、時間) 再填進樣板。
+輸出只由這份內容決定 (沒有亂數 id、數字格式固定)，同樣的內容得到逐位元組相同的 HTML，
+因此以內容為鍵快取：同一份快照的電廠圖、機組圖與分區圖只渲染一次，數字沒變的快照也直接命中。
+"""
+from functools import lru_cache
+from typing import NamedTuple
+
+import folium
+from folium.template import Template
+
+from .catalog import color_map, order_keys
+
+HUD_FIELDS = (('total', '總發電量', '#aaa'), ('fire', '火力合計', '#FF4500'), ('nuclear', '核能', 'yellow'),
+              ('green', '風光綠能', '#00FF00'), ('pumped', '抽蓄儲能', '#9932CC'))
+
+
+def hud_totals(stats, total_gen):
+    return {
+        'total': total_gen,
+        'fire': stats['燃氣'] + stats['燃煤'] + stats['燃油'],
+        'nuclear': stats['核能'],
+        'green': stats['風力'] + stats['太陽能'],
+        'pumped': stats['抽蓄'],
+    }
+
+
+def legend_items(stats, total_gen):
+    """[(類別, 顏色, 百分比), ...]，依 order_keys 排列；總發電量為 0 時各類別都列出、顯示 0%"""
+    return [(k, color_map[k], stats[k] / total_gen * 100 if total_gen > 0 else 0.0) for k in order_keys if k in stats]
+
+
+class OverlayPayload(NamedTuple):
+    """每份快照填進樣板的內容 (已格式化的字串，可直接當快取鍵)"""
+    hud: tuple        # HUD_FIELDS 順序的 MW 數字
+    rows: tuple       # ((類別, 顏色, 百分比), ...)
+    gradient: str     # 圓餅圖的 conic-gradient 分段
+    total: str        # 總發電量
+    note: str         # 標題右側的小字 (時間或「(可拖曳)」)
+
+
+def overlay_payload(stats, total_gen, note="(可拖曳)"):
+    hud = hud_totals(stats, total_gen)
+    rows, stops, acc = [], [], 0
+    for key, color, pct in legend_items(stats, total_gen):
+        rows.append((key, color, f"{pct:.1f}"))
+        stops.append(f"{color} {acc:.1f}% {acc + pct:.1f}%")
+        acc += pct
+    return OverlayPayload(tuple(f"{hud[k]:,.0f}" for k, _, _ in HUD_FIELDS), tuple(rows), ", ".join(stops),
+                          f"{total_gen:,.0f}", str(note))
+
+
+OVERLAY_STATIC = """
+<style>
+    .pm-hud {
+        position: fixed; top: 60px; left: 50%; transform: translateX(-50%); z-index: 9999;
+        background-color: rgba(20, 20, 20, 0.7); padding: 10px 20px; border-radius: 50px; border: 1px solid #444;
+        display: flex; gap: 25px; color: white; font-family: 'Arial', sans-serif; font-size: 14px;
+        backdrop-filter: blur(5px); box-shadow: 0 4px 6px rgba(0,0,0,0.3); white-space: nowrap;
+    }
+    .pm-hud .cell { display: flex; flex-direction: column; align-items: center; }
+    .pm-hud .label { font-size: 10px; }
+    .pm-hud .value { font-weight: bold; }
+    .pm-hud .main { font-size: 16px; }
+    .pm-hud .unit { font-size: 10px; font-weight: normal; }
+    .pm-hud .sep { width: 1px; background: #555; }
+    .pm-legend {
+        position: fixed; bottom: 30px; left: 30px; width: 260px; z-index: 9999;
+        background-color: rgba(30, 30, 30, 0.9); color: white; padding: 15px; border-radius: 12px; border: 1px solid #555;
+        box-shadow: 0 4px 15px rgba(0,0,0,0.5);
+        cursor: move; /* 鼠標變成移動十字 */
+        user-select: none; /* 防止拖曳時選取文字 */
+    }
+    .pm-legend .title { font-size: 16px; font-weight: bold; margin-bottom: 5px; padding-bottom: 5px; border-bottom: 1px solid #555; }
+    .pm-legend .note { font-size: 11px; font-weight: normal; color: #aaa; float: right; margin-top: 4px; }
+    .pm-legend .body { display: flex; align-items: flex-start; margin-top: 10px; }
+    .pm-legend .pie { width: 80px; height: 80px; border-radius: 50%; margin-right: 15px; flex-shrink: 0; border: 2px solid #fff; }
+    .pm-legend .rows { font-size: 12px; line-height: 1.5; width: 100%; }
+    .pm-legend .rows div { display: flex; justify-content: space-between; }
+    .pm-legend .total { margin-top: 8px; font-size: 11px; color: #ddd; text-align: center; background: #444; border-radius: 4px; }
+</style>
+<script>
+    // 圖例拖曳：拖動時改以 top/left 定位 (清除 bottom 以免衝突)；
+    // 頁面載入後才插入時 (增量地圖元件) 直接綁定
+    (function () {
+        function bind() {
+            var elmnt = document.getElementById("draggable-legend");
+            if (!elmnt) return;
+            var pos1 = 0, pos2 = 0, pos3 = 0, pos4 = 0;
+            elmnt.onmousedown = function (e) {
+                e = e || window.event;
+                e.preventDefault();
+                pos3 = e.clientX;
+                pos4 = e.clientY;
+                document.onmouseup = function () { document.onmouseup = null; document.onmousemove = null; };
+                document.onmousemove = function (e) {
+                    e = e || window.event;
+                    e.preventDefault();
+                    pos1 = pos3 - e.clientX;
+                    pos2 = pos4 - e.clientY;
+                    pos3 = e.clientX;
+                    pos4 = e.clientY;
+                    elmnt.style.top = (elmnt.offsetTop - pos2) + "px";
+                    elmnt.style.left = (elmnt.offsetLeft - pos1) + "px";
+                    elmnt.style.bottom = "auto";
+                };
+            };
+        }
+        if (document.readyState === "loading") document.addEventListener("DOMContentLoaded", bind);
+        else bind();
+    })();
+</script>
+"""
+
+# HUD 與圖例本身 (不含 OVERLAY_STATIC)
+_BODY = Template("""
+{%- if hud %}
+<div class="pm-hud">
+{%- for (key, label, color), value in hud %}
+    <div class="cell"><span class="label" style="color:{{ color }};">{{ label }}</span>
+    {%- if loop.first %}<span class="value main">{{ value }} <span class="unit">MW</span></span></div><div class="sep"></div>
+    {%- else %}<span class="value">{{ value }}</span></div>{% endif %}
+{%- endfor %}
+</div>
+{%- endif %}
+<div id="draggable-legend" class="pm-legend" style="font-family: {{ font }};">
+    <div class="title">{{ title }}<span class="note">{{ p.note }}</span></div>
+    <div class="body">
+        <div class="pie" style="background: conic-gradient({{ p.gradient }});"></div>
+        <div class="rows">
+        {%- for key, color, pct in p.rows %}<div style="color:{{ color }};"><span>■ {{ key }}</span> <span>{{ pct }}%</span></div>{% endfor -%}
+        </div>
+    </div>
+    {%- if show_total %}
+    <div class="total">總發電量: {{ p.total }} MW</div>
+    {%- endif %}
+</div>
+""")
+
+# 版面選項：app.py 的戰情室 (HUD + 可拖曳圖例) 與 appv9.py 的 V9 樣式 (圖例附時間與總發電量)
+DASHBOARD = {'hud': True, 'title': "⚡ 電力戰情", 'font': "Arial", 'show_total': False}
+V9 = {'hud': False, 'title': "⚡ 台灣電力戰情", 'font': "'Microsoft JhengHei', Arial", 'show_total': True}
+
+
+@lru_cache(maxsize=256)
+def _render(payload, hud, title, font, show_total, static=True):
+    body = _BODY.render(p=payload, hud=zip(HUD_FIELDS, payload.hud) if hud else None, title=title, font=font,
+                        show_total=show_total)
+    return OVERLAY_STATIC.rstrip() + body if static else body
+
+
+def overlay_html(stats, total_gen, note="(可拖曳)", layout=DASHBOARD, static=True):
+    """HUD + 圖例的 HTML (同樣的數字與版面回傳同一份快取的字串)
+
+    static=False 時不含 OVERLAY_STATIC 的 CSS 與拖曳腳本：增量地圖元件只載入它一次，之後只換這一段。
+    """
+    return _render(overlay_payload(stats, total_gen, note), static=static, **layout)
+
+
+def add_overlays(m, stats, total_gen, note="(可拖曳)", layout=DASHBOARD):
+    """把 HUD 與圖例加到 folium 地圖 (電廠模式、機組模式與 V9 靜態地圖共用)"""
+    m.get_root().html.add_child(folium.Element(overlay_html(stats, total_gen, note, layout)))
+    return m
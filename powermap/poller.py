@@ -0,0 +1,130 @@
+"""每個伺服器行程一個的背景抓取器 (stale-while-revalidate)
+
+背景執行緒依排程更新快照；使用者頁面只讀取「最後一份成功的快照」，
+不會在自己的 script run 裡等待台電回應。同一時間只會有一個抓取在進行
+(single-flight)，其他呼叫 refresh() 的人直接等它的結果。
+"""
+import logging
+import threading
+from dataclasses import replace
+from datetime import datetime
+from types import MappingProxyType
+
+from .feed import FeedClient
+from .metrics import poll_results
+from .snapshot import TW_TZ, build_snapshot
+
+log = logging.getLogger(__name__)
+
+
+class SnapshotPoller:
+    def __init__(self, load=None, interval=60, retry_interval=15, initial=None, commit=None):
+        # load(): 回傳 (機組表, 內容雜湊)，資料未變更時回傳 None；
+        #         也可多帶附屬資料 (機組表, 內容雜湊, feeds)，機組表為 None 表示只有附屬資料變了
+        #         (見 powermap.feeds.MultiFeedFetcher)
+        # commit(): 新快照發布後呼叫，load 才記住交出的內容 (ETag、雜湊)；快照沒建成就不呼叫，
+        #           下一輪會重新下載、重新解析，而不是被當成「未變更」
+        if load is None:
+            client = FeedClient()
+            load, commit = client.load, client.commit
+        self.load = load
+        self.commit = commit
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.snapshot = initial       # 最後一份成功的快照 (initial: 暖啟動快取讀回的那份)
+        self.last_error = None        # 最近一次失敗原因 (成功後清除)
+        self.last_attempt = None
+        self.checked_at = None        # 最近一次成功向上游確認 (含「未變更」)
+        self.listeners = []           # 有新快照時呼叫 listener(snapshot)，例如寫入歷史資料
+        self._cond = threading.Condition()
+        self._inflight = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="taipower-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+        return listener
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            delay = self.interval if self.last_error is None else self.retry_interval
+            self._stop.wait(delay)
+
+    def refresh(self):
+        """抓取一次新資料 (內容未變更則沿用舊快照)；若已有抓取進行中則等待並共用其結果"""
+        with self._cond:
+            if self._inflight:
+                while self._inflight:
+                    self._cond.wait()
+                return self.snapshot
+            self._inflight = True
+
+        snapshot = None
+        units_changed = False
+        try:
+            self.last_attempt = datetime.now(TW_TZ)
+            result = self.load()
+            if result is not None:
+                df, content_hash, *rest = result
+                feeds = rest[0] if rest else None
+                if df is None:
+                    # 機組資料沒變：沿用同一份快照 (差異、渲染快取都還有效)，只換上新的附屬資料；
+                    # 還沒有任何快照時無從沿用，等機組資料進來
+                    if self.snapshot is not None:
+                        snapshot = replace(self.snapshot, feeds=MappingProxyType(dict(feeds)))
+                else:
+                    snapshot = build_snapshot(df, fetched_at=self.last_attempt, content_hash=content_hash,
+                                              previous=self.snapshot, feeds=feeds)
+                    units_changed = True
+        except Exception as e:
+            log.warning("台電資料抓取失敗: %s", e)
+            self.last_error = e
+            poll_results.inc('error')
+        else:
+            self.last_error = None
+            poll_results.inc('new' if snapshot is not None else 'unchanged')
+            self.checked_at = self.last_attempt
+
+        with self._cond:
+            if snapshot is not None:
+                self.snapshot = snapshot
+                if self.commit is not None:
+                    self.commit()   # 在放行下一次抓取之前，避免它拿還沒記住的驗證資訊送出請求
+            self._inflight = False
+            self._cond.notify_all()
+
+        if units_changed:   # 歷史資料等 listener 只關心機組資料
+            for listener in self.listeners:
+                try:
+                    listener(snapshot)
+                except Exception:
+                    log.exception("快照處理失敗: %r", listener)
+        return self.snapshot
+
+    def age_seconds(self):
+        """距離上次成功向上游確認的秒數"""
+        if self.checked_at is None:
+            return None
+        return (datetime.now(TW_TZ) - self.checked_at).total_seconds()
+
+    def latest(self, timeout=None):
+        """立即回傳最新快照；行程剛啟動還沒有任何資料時，等第一次抓取結束"""
+        if self.snapshot is None:
+            if self._thread is None:
+                return self.refresh()
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self.snapshot is not None or (self.last_attempt is not None and not self._inflight),
+                    timeout,
+                )
+        return self.snapshot
@@ -0,0 +1,133 @@
+"""區域彙總：北部 / 中部 / 南部 / 東部 / 離島 (金門、馬祖、澎湖、蘭嶼綠島 各自分區)
+
+區域以粗略的經緯度多邊形描述 (含近海，離岸風場歸入對岸的區域；宜蘭依行政區習慣歸北部)。
+模組載入時先為所有多邊形建外框索引，並把座標字典裡每座電廠判斷一次所在分區；
+之後每份快照只要以電廠鍵值查表再 bincount，不會重做點在多邊形的判斷。
+批次 (整段歷史資料) 請用 region_totals(df, by='ts')。
+"""
+import numpy as np
+import pandas as pd
+
+from .aggregate import PLANT_COORDS
+from .catalog import order_keys
+
+REGIONS = ('北部', '中部', '南部', '東部', '離島')
+UNLOCATED = '未定位'
+
+# (分區, 所屬區域, 多邊形 [(經度, 緯度), ...])；重疊時以排在前面的為準 (離島優先)
+ZONES = (
+    ('金門', '離島', [(118.1, 24.3), (118.6, 24.3), (118.6, 24.6), (118.1, 24.6)]),
+    ('馬祖', '離島', [(119.8, 25.9), (120.6, 25.9), (120.6, 26.5), (119.8, 26.5)]),
+    ('澎湖', '離島', [(119.25, 23.1), (119.8, 23.1), (119.8, 23.8), (119.25, 23.8)]),
+    ('蘭嶼綠島', '離島', [(121.4, 21.9), (121.7, 21.9), (121.7, 22.75), (121.4, 22.75)]),
+    ('北部', '北部', [(119.9, 24.70), (120.85, 24.68), (121.0, 24.55), (121.25, 24.45), (121.5, 24.45),
+                      (121.85, 24.40), (122.2, 24.40), (122.2, 25.6), (119.9, 25.6)]),
+    ('中部', '中部', [(119.9, 24.70), (120.85, 24.68), (121.0, 24.55), (121.25, 24.45), (121.35, 24.20),
+                      (121.30, 23.90), (121.05, 23.45), (120.75, 23.55), (120.5, 23.62), (120.15, 23.58), (119.9, 23.58)]),
+    ('東部', '東部', [(121.25, 24.45), (121.5, 24.45), (121.85, 24.40), (122.2, 24.40), (122.2, 22.3), (120.9, 22.3),
+                      (120.85, 22.6), (120.75, 22.9), (120.85, 23.1), (121.05, 23.45), (121.30, 23.90), (121.35, 24.20)]),
+    ('南部', '南部', [(119.9, 23.58), (120.15, 23.58), (120.5, 23.62), (120.75, 23.55), (121.05, 23.45), (120.85, 23.1),
+                      (120.75, 22.9), (120.85, 22.6), (120.9, 22.3), (121.0, 21.8), (120.5, 21.7), (119.9, 22.3)]),
+)
+ZONE_NAMES = tuple(z[0] for z in ZONES)
+
+
+def _inside(polygon, x, y):
+    """射線法：點 (x, y) 是否在多邊形內 (x, y 為 numpy 陣列)"""
+    inside = np.zeros(len(x), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(polygon, polygon[1:] + polygon[:1]):
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hit = crosses & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+        inside ^= hit
+    return inside
+
+
+class RegionIndex:
+    """多邊形外框索引 + 射線法判斷 (numpy 向量化，一次判斷一批座標)"""
+
+    def __init__(self, zones=ZONES):
+        self.zones = zones
+        self.bounds = np.array([[min(x for x, _ in p), min(y for _, y in p), max(x for x, _ in p), max(y for _, y in p)]
+                                for _, _, p in zones])
+
+    def locate(self, lats, lons):
+        """座標陣列 -> 分區代碼陣列 (zones 的索引；-1 為不在任何分區內)"""
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        codes = np.full(len(lats), -1)
+        for i, (_, _, polygon) in enumerate(self.zones):
+            x0, y0, x1, y1 = self.bounds[i]
+            todo = np.flatnonzero((codes < 0) & (lons >= x0) & (lons <= x1) & (lats >= y0) & (lats <= y1))
+            if todo.size:
+                codes[todo[_inside(polygon, lons[todo], lats[todo])]] = i
+        return codes
+
+
+REGION_INDEX = RegionIndex()
+ZONE_REGION = np.array([REGIONS.index(z[1]) for z in ZONES])
+
+# 電廠鍵值 -> 分區代碼 (載入時一次算完)
+_keys = list(PLANT_COORDS)
+_lats, _lons = zip(*(PLANT_COORDS[k] for k in _keys))
+PLANT_ZONES = dict(zip(_keys, REGION_INDEX.locate(_lats, _lons).tolist()))
+
+
+def zone_codes(plant_keys):
+    """電廠鍵值序列 -> 分區代碼 ndarray (未歸戶或不在任何分區內為 -1)"""
+    codes, uniques = pd.factorize(pd.Series(plant_keys, copy=False))
+    table = np.array([PLANT_ZONES.get(k, -1) for k in uniques] + [-1])
+    return table[codes]   # codes 為 -1 (缺值) 時取到最後一格的 -1
+
+
+def _labels(level):
+    return ZONE_NAMES if level == 'zone' else REGIONS
+
+
+def _codes(plant_keys, level):
+    zones = zone_codes(plant_keys)
+    return zones if level == 'zone' else np.where(zones >= 0, ZONE_REGION[zones], -1)
+
+
+def regional_mix(units, level='region'):
+    """單一快照的區域彙總 (index=區域或分區，columns=各類別正向發電量 + total + net)
+
+    level='region' 為 北部/中部/南部/東部/離島，'zone' 則把離島拆成金門/馬祖/澎湖/蘭嶼綠島。
+    類別欄位與 stats 相同只計正向發電量，net 為含抽水負值的淨發電量；
+    沒有座標的機組歸入「未定位」(有的話才出現)。
+    """
+    labels = _labels(level)
+    codes = _codes(units['plant_key'], level)
+    codes = np.where(codes >= 0, codes, len(labels))
+    gen = units['gen'].to_numpy(dtype=float)
+    cat_codes, categories = pd.factorize(units['category'])
+    n_rows, n_cats = len(labels) + 1, len(categories)
+    pos = np.bincount(codes * n_cats + cat_codes, weights=np.clip(gen, 0, None), minlength=n_rows * n_cats)
+    mix = pd.DataFrame(pos.reshape(n_rows, n_cats), index=pd.Index([*labels, UNLOCATED], name=level),
+                       columns=list(categories))
+    mix = mix.reindex(columns=[k for k in order_keys if k in mix] + [k for k in mix if k not in order_keys])
+    mix['total'] = pos.reshape(n_rows, n_cats).sum(axis=1)
+    mix['net'] = np.bincount(codes, weights=gen, minlength=n_rows)
+    if not (codes == len(labels)).any():
+        mix = mix.drop(index=UNLOCATED)
+    return mix
+
+
+def region_totals(units, by=None, level='region'):
+    """各區域正向發電量合計；by 指定欄位 (例如 'ts') 時回傳 (by × 區域) 表，適合整段歷史資料"""
+    labels = np.array([*_labels(level), UNLOCATED], dtype=object)
+    codes = _codes(units['plant_key'], level)
+    region = pd.Series(labels[np.where(codes >= 0, codes, len(labels) - 1)], index=units.index, name=level)
+    pos = units['gen'].clip(lower=0)
+    if by is None:
+        return pos.groupby(region, sort=False).sum().reindex(labels).dropna()
+    totals = pos.groupby([units[by], region], sort=True).sum().unstack(fill_value=0)
+    return totals.reindex(columns=[c for c in labels if c in totals.columns])
+
+
+def zone_polygons():
+    """GeoJSON FeatureCollection (choropleth 用；properties 只有分區與區域名稱)"""
+    return {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {'zone': name, 'region': region},
+         'geometry': {'type': 'Polygon', 'coordinates': [[list(p) for p in polygon + polygon[:1]]]}}
+        for name, region, polygon in ZONES
+    ]}
@@ -0,0 +1,248 @@
+"""地圖渲染 (電廠圓點 / 機組叢集 + HUD + 可拖曳圖例，後兩者見 powermap.overlay) 與跨使用者共用的 HTML 快取"""
+import json
+import threading
+from collections import OrderedDict
+
+import folium
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster
+from folium.template import Template
+
+from .aggregate import DETAIL_LIMIT, PLANT_COORDS
+from .metrics import timed
+from .overlay import add_overlays
+from .regions import zone_polygons
+from .tiles import map_tiles
+
+
+def marker_radius(gen_mw):
+    # 負數(抽水)也給它大小
+    radius = (abs(gen_mw) ** 0.5) * 0.8
+    return 3 if radius < 3 else radius
+
+
+def build_map(stats, total_gen, plant_groups, tiles=None, regions=None):
+    # --- 地圖繪製 ---
+    m = folium.Map(location=[23.6, 121.0], zoom_start=8, **map_tiles(tiles))
+
+    # 選用：分區 choropleth (regions 為 regional_mix(units, level='zone') 的結果)，畫在圓點下方
+    if regions is not None:
+        region_layer(regions).add_to(m)
+
+    # 繪製圓點 (popup 於點擊時由前端組出)
+    PlantMarkers(plant_groups).add_to(m)
+
+    add_overlays(m, stats, total_gen)
+    return m
+
+
+def region_layer(mix):
+    """分區 choropleth：填色深淺依各分區正向發電量占比，滑過顯示發電結構"""
+    total = mix['total'].sum()
+    peak = max(mix['total'].max(), 1e-9)
+    categories = [c for c in mix.columns if c not in ('total', 'net')]
+    data = zone_polygons()
+    for feature in data['features']:
+        row = mix.loc[feature['properties']['zone']] if feature['properties']['zone'] in mix.index else None
+        gen = 0.0 if row is None else float(row['total'])
+        top = [] if row is None else sorted(((row[c], c) for c in categories if row[c] > 0), reverse=True)[:4]
+        feature['properties'].update(
+            total=f"{gen:,.0f} MW", share=f"{gen / total * 100:.1f}%" if total > 0 else "-",
+            mix="、".join(f"{c} {v / gen * 100:.0f}%" for v, c in top) or "-", weight=gen / peak,
+        )
+    return folium.GeoJson(
+        data, name="區域供電",
+        style_function=lambda f: {'fillColor': '#FFD700', 'fillOpacity': 0.05 + 0.45 * f['properties']['weight'],
+                                  'color': '#888888', 'weight': 1},
+        tooltip=folium.GeoJsonTooltip(fields=['zone', 'total', 'share', 'mix'], aliases=['分區', '發電', '占比', '結構']),
+    )
+
+
+class PlantMarkers(MacroElement):
+    """電廠圓點圖層：所有電廠的資料以一張 JSON 表輸出，popup 在點擊時才由前端樣板組出
+
+    每列：[lat, lon, 半徑, 顏色代碼, 名稱, 類別代碼, 淨發電量, [明細...]]；
+    負值 (抽水) 以紅字加上 negative_label 顯示，與原本伺服器端組的 HTML 相同。
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var palette = {{ this.palette|tojson }}, types = {{ this.types|tojson }};
+            var rows = {{ this.rows|tojson }}, negativeLabel = {{ this.negative_label|tojson }};
+            function esc(s) {
+                return String(s).replace(/[&<>"']/g, function (c) {
+                    return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c];
+                });
+            }
+            function popup(row) {
+                var color = palette[row[3]], gen = row[6];
+                var mw = gen < 0 ? "<span style='color:red'>" + gen.toFixed(1) + " (" + negativeLabel + ")</span>" : gen.toFixed(1) + " MW";
+                return '<div style="font-family: Arial; min-width: 150px;">' +
+                    '<b style="font-size:14px">' + esc(row[4]) + '</b><br>' +
+                    '<span style="color:' + color + '; font-weight:bold;">● ' + esc(types[row[5]]) + '</span><br>' +
+                    '<b>' + mw + '</b><hr style="margin:5px 0">' +
+                    '<div style="font-size:11px; color:#555">' + row[7].map(esc).join("<br>") + '</div></div>';
+            }
+            rows.forEach(function (row) {
+                var color = palette[row[3]];
+                L.circleMarker([row[0], row[1]], {radius: row[2], color: color, fillColor: color, fill: true, fillOpacity: 0.8, weight: 1})
+                    .bindPopup(function () { return popup(row); }, {maxWidth: 250})
+                    .addTo({{ this._parent.get_name() }});
+            });
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, plant_groups, negative_label="抽水/負載"):
+        super().__init__()
+        self._name = "PlantMarkers"
+        palette, types, self.rows = {}, {}, []
+        for name, data in plant_groups.items():
+            lat, lon = data['coords']
+            color_idx = palette.setdefault(data['color'], len(palette))
+            type_idx = types.setdefault(data['type'], len(types))
+            self.rows.append([lat, lon, round(marker_radius(data['total_gen']), 2), color_idx, name, type_idx,
+                              round(data['total_gen'], 1), list(data['details'][:DETAIL_LIMIT])])
+        self.palette, self.types = list(palette), list(types)
+        self.negative_label = negative_label
+
+
+# ---------------------------------------------------------
+# 機組模式：每台機組一個點 (canvas + 前端叢集)
+# ---------------------------------------------------------
+UNIT_SPREAD_DEG = 0.004     # 同一電廠的機組以螺旋狀散開 (約 400 公尺 × √序號)
+_GOLDEN_ANGLE = np.pi * (3 - np.sqrt(5))
+
+# 每列資料：[lat, lon, 半徑, 顏色代碼, 名稱, 淨發電量, 類別代碼, 電廠]；popup 點開時才組 HTML
+_UNIT_CALLBACK = """function (row) {
+    var color = PALETTE[row[3]], gen = row[5];
+    var marker = L.circleMarker([row[0], row[1]], {radius: row[2], color: color, fillColor: color,
+                                                  fill: true, fillOpacity: 0.8, weight: 1});
+    marker.bindPopup(function () {
+        var mw = gen < 0 ? "<span style='color:red'>" + gen.toFixed(1) + " (抽水/負載)</span>" : gen.toFixed(1) + " MW";
+        var div = document.createElement("div");
+        div.style.cssText = "font-family: Arial; min-width: 150px;";
+        div.innerHTML = '<b style="font-size:14px"></b><br><span style="color:' + color + '; font-weight:bold;"></span><br>' +
+            '<b>' + mw + '</b><hr style="margin:5px 0"><div style="font-size:11px; color:#555"></div>';
+        div.children[0].textContent = row[4];
+        div.children[2].textContent = "● " + CATEGORIES[row[6]];
+        div.lastChild.textContent = row[7];
+        return div;
+    }, {maxWidth: 250});
+    return marker;
+}"""
+
+
+def unit_points(units):
+    """機組表 -> [[lat, lon, 半徑, 顏色代碼, 名稱, 淨發電量, 類別代碼, 電廠], ...], 顏色表, 類別表"""
+    located = units[units['plant_key'].notna()]
+    if located.empty:
+        return [], [], []
+    keys = located['plant_key'].to_numpy()
+    coords = np.array([PLANT_COORDS[k] for k in keys], dtype=float).reshape(-1, 2)
+    rank = located.groupby('plant_key', sort=False).cumcount().to_numpy()
+    dist = UNIT_SPREAD_DEG * np.sqrt(rank)
+    lat = coords[:, 0] + dist * np.sin(rank * _GOLDEN_ANGLE)
+    lon = coords[:, 1] + dist * np.cos(rank * _GOLDEN_ANGLE)
+
+    gen = located['gen'].to_numpy(dtype=float)
+    radius = np.maximum(np.sqrt(np.abs(gen)) * 0.8, 3)
+    color_codes, palette = pd.factorize(located['color'])
+    cat_codes, categories = pd.factorize(located['category'])
+    rows = zip(np.round(lat, 5).tolist(), np.round(lon, 5).tolist(), np.round(radius, 1).tolist(), color_codes.tolist(),
+               located['name'].astype(str).tolist(), np.round(gen, 1).tolist(), cat_codes.tolist(), keys.tolist())
+    return [list(r) for r in rows], list(palette), list(categories)
+
+
+def build_unit_map(units, stats, total_gen, tiles=None):
+    """每台機組畫一個點：資料整包交給前端 (FastMarkerCluster)，以 canvas 繪製並依縮放層級叢集"""
+    m = folium.Map(location=[23.6, 121.0], zoom_start=8, prefer_canvas=True, **map_tiles(tiles))
+    data, palette, categories = unit_points(units)
+    callback = (f"(function () {{ var PALETTE = {json.dumps(palette)}, CATEGORIES = {json.dumps(categories, ensure_ascii=False)};"
+                f" return {_UNIT_CALLBACK}; }})()")
+    FastMarkerCluster(
+        data, callback=callback,
+        options={'chunkedLoading': True, 'disableClusteringAtZoom': 11, 'spiderfyOnMaxZoom': False, 'maxClusterRadius': 50},
+    ).add_to(m)
+    add_overlays(m, stats, total_gen)
+    return m
+
+
+class RenderCache:
+    """以 (快照內容雜湊, 渲染選項) 為鍵的 LRU 快取 (地圖 HTML 以及其他每份快照算一次的結果)
+
+    同一份快照不論多少人在看都只渲染一次；同一把鍵同時只有一個執行緒在渲染，
+    其餘請求等它完成後直接取用結果。
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        return None
+
+    def get_or_compute(self, key, compute):
+        value = self._lookup(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                value = self._lookup(key)
+                if value is not None:
+                    return value
+                value = compute()
+                with self._lock:
+                    self.misses += 1
+                    self._entries[key] = value
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+            finally:
+                # compute 失敗時也要釋放這把鍵的鎖，下一個請求才能重試
+                with self._lock:
+                    if self._key_locks.get(key) is key_lock:
+                        del self._key_locks[key]
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def render_key(snapshot, build, **options):
+        return (snapshot_version(snapshot), build.__name__, tuple(sorted(options.items())))
+
+    def get_or_render(self, snapshot, build, **options):
+        key = self.render_key(snapshot, build, **options)
+        return self.get_or_compute(key, lambda: self._render(snapshot, build, options))
+
+    @staticmethod
+    def _render(snapshot, build, options):
+        with timed('render'):
+            return build(snapshot.stats, snapshot.total_gen, snapshot.plant_groups, **options).get_root().render()
+
+
+def snapshot_version(snapshot):
+    # 沒有內容雜湊時用遞增編號：id() 在物件回收後會被重複使用，新快照可能撞到舊的快取
+    return snapshot.content_hash or f"serial-{snapshot.serial}"
+
+
+# 行程內共用 (Streamlit 各 session 與其他呼叫端都看得到同一份)
+map_cache = RenderCache()
@@ -0,0 +1,160 @@
+"""多解析度彙總 (1 分 / 15 分 / 1 小時 / 1 天) 與 LTTB 降採樣
+
+每份新快照進來時，把各類別 (stats，正向發電量) 與各電廠 (淨發電量) 的合計
+累加到四種解析度的時間桶，桶值為該時段的平均 MW。圖表查詢依時間範圍挑
+最細但點數不過多的解析度，再以 largest-triangle-three-buckets 降到指定點數，
+不論查多長的區間都不必掃描原始歷史資料。
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .snapshot import TW_TZ
+
+log = logging.getLogger(__name__)
+
+# 解析度名稱 -> (桶長秒數, 保留期間)
+RESOLUTIONS = {
+    '1min': (60, timedelta(days=2)),
+    '15min': (900, timedelta(days=45)),
+    '1h': (3600, timedelta(days=400)),
+    '1d': (86400, None),
+}
+
+
+def _epoch(ts):
+    return pd.Timestamp(ts).timestamp()
+
+
+class RollupStore:
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.resolutions = resolutions
+        self._lock = threading.Lock()
+        # (by, 解析度) -> {桶起點 epoch 秒: [次數, {鍵: 加總}]}
+        self._buckets = {(by, res): {} for by in ('category', 'plant_key') for res in resolutions}
+        self.backfilling = False
+        self.covered_from = None    # 回填進度：這個時間點之後的歷史資料已經併入 (None 為尚未開始)
+
+    # --- 寫入 ---
+    def add(self, ts, category_totals, plant_totals):
+        t = _epoch(ts)
+        with self._lock:
+            for res, (seconds, retention) in self.resolutions.items():
+                start = t - t % seconds
+                for by, totals in (('category', category_totals), ('plant_key', plant_totals)):
+                    buckets = self._buckets[(by, res)]
+                    bucket = buckets.get(start)
+                    if bucket is None:
+                        bucket = buckets[start] = [0, {}]
+                        self._prune(buckets, t, retention)
+                    bucket[0] += 1
+                    sums = bucket[1]
+                    for k, v in totals.items():
+                        sums[k] = sums.get(k, 0.0) + v
+
+    @staticmethod
+    def _prune(buckets, now, retention):
+        if retention is None:
+            return
+        cutoff = now - retention.total_seconds()
+        for start in [s for s in buckets if s < cutoff]:
+            del buckets[start]
+
+    def add_snapshot(self, snapshot):
+        """SnapshotPoller 的 listener"""
+        plants = {k: g['total_gen'] for k, g in snapshot.plant_groups.items()}
+        self.add(snapshot.fetched_at, snapshot.stats, plants)
+
+    def backfill(self, history, start, end=None, chunk=timedelta(days=1)):
+        """由歷史資料重建 [start, end)：由新到舊一段一段讀，每段做完就可以查詢 (covered_from 往前推)
+
+        end 之後的快照由 add_snapshot 即時累加，兩邊不會重複計算。
+        """
+        end = end or datetime.now(TW_TZ)
+        count = 0
+        while end > start:
+            lo = max(start, end - chunk)
+            cats = history.series(lo, end, by='category')
+            if not cats.empty:
+                cats = cats[cats.index < end]        # 邊界那一刻歸下一段 (或即時累加)
+                plants = history.series(lo, end, by='plant_key').reindex(cats.index, fill_value=0)
+                for ts, cat_row, plant_row in zip(cats.index, cats.to_dict('records'), plants.to_dict('records')):
+                    self.add(ts, cat_row, plant_row)
+                count += len(cats)
+            self.covered_from = end = lo
+        return count
+
+    def start_backfill(self, history, start, end=None):
+        """在背景執行緒回填 (伺服器啟動時不必等它讀完整個月的歷史資料)"""
+        end = end or datetime.now(TW_TZ)
+        self.backfilling = True
+
+        def run():
+            try:
+                log.info("彙總回填完成：%d 份快照", self.backfill(history, start, end))
+            except Exception:
+                log.exception("彙總回填失敗 (僅保留已讀入的部分)")
+            finally:
+                self.backfilling = False
+
+        threading.Thread(target=run, name="rollup-backfill", daemon=True).start()
+        return self
+
+    # --- 查詢 ---
+    def pick_resolution(self, start, end, max_points):
+        """桶數不超過 4 × max_points 的最細解析度 (再交給 LTTB 收斂)"""
+        span = _epoch(end) - _epoch(start)
+        for res, (seconds, retention) in self.resolutions.items():
+            fits_retention = retention is None or datetime.now(TW_TZ) - retention <= pd.Timestamp(start)
+            if span / seconds <= 4 * max_points and fits_retention:
+                return res
+        return list(self.resolutions)[-1]
+
+    def series(self, start, end=None, by='category', resolution=None, keys=None, max_points=2000):
+        """(index=時間, columns=類別或電廠) 的平均 MW，點數最多 max_points"""
+        end = end or datetime.now(TW_TZ)
+        resolution = resolution or self.pick_resolution(start, end, max_points)
+        lo, hi = _epoch(start), _epoch(end)
+        with self._lock:
+            rows = [(s, {k: v / n for k, v in sums.items()})
+                    for s, (n, sums) in sorted(self._buckets[(by, resolution)].items()) if lo <= s <= hi]
+        if not rows:
+            return pd.DataFrame()
+        index = pd.to_datetime([s for s, _ in rows], unit='s', utc=True).tz_convert(TW_TZ)
+        df = pd.DataFrame([r for _, r in rows], index=index).fillna(0)
+        if keys is not None:
+            df = df.reindex(columns=list(keys), fill_value=0)
+        return downsample(df, max_points)
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets：回傳保留下來的點的索引 (含頭尾)"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)   # 中間 n_out-2 個桶的邊界
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 下一個桶的平均點 (最後一個桶用終點)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def downsample(df, max_points):
+    """多欄位一起降採樣：以各欄合計挑點，所有欄位使用相同的時間點 (疊圖不會錯位)"""
+    if len(df) <= max_points:
+        return df
+    x = df.index.asi8 if isinstance(df.index, pd.DatetimeIndex) else np.arange(len(df))
+    return df.iloc[lttb(x, df.sum(axis=1).to_numpy(), max_points)]
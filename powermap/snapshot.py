@@ -0,0 +1,61 @@
+"""一次抓取的完整結果：機組表 + 統計 + 電廠歸戶 (所有使用者共用，唯讀)
+
+整個行程只有一份，各 session 直接引用同一個物件 (不像 st.cache_data 每次複製)；
+統計與電廠歸戶包成唯讀 mapping (電廠座標為 tuple)；機組表靠 pandas 3 的 copy-on-write
+(requirements.txt 要求 pandas>=3，之前的版本預設沒有開)，各 session 衍生出的表不會改到共用的那一份。
+
+給了上一份快照時，機組清單沒變就走增量路徑 (見 powermap.diff)，並附上兩份之間的差異。
+"""
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+
+import pandas as pd
+import pytz
+
+from .aggregate import aggregate, classify_units
+from .diff import REBASE_EVERY, apply_incremental, diff_units, elapsed_minutes, same_layout
+from .metrics import timed
+
+TW_TZ = pytz.timezone('Asia/Taipei')
+_serials = itertools.count(1)
+
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    units: pd.DataFrame
+    stats: dict
+    total_gen: float
+    plant_groups: dict
+    fetched_at: datetime
+    content_hash: str = None
+    restored: bool = False        # 由暖啟動快取讀回 (尚未向台電確認過)
+    diff: object = None           # 與上一份快照的差異 (SnapshotDiff)；第一份為 None
+    feeds: dict = None            # 同一輪抓到的附屬資料 (名稱 -> 內容，見 powermap.feeds)
+    # 行程內遞增的編號 (沒有內容雜湊時當版本用；dataclasses.replace 會沿用原本的編號)
+    serial: int = field(default_factory=lambda: next(_serials), compare=False)
+
+
+def build_snapshot(df, fetched_at=None, content_hash=None, previous=None, feeds=None):
+    fetched_at = fetched_at or datetime.now(TW_TZ)
+    feeds = MappingProxyType(dict(feeds)) if feeds is not None else None
+    diff = None
+    if previous is not None:
+        minutes = elapsed_minutes(previous, df, fetched_at)
+        chain = previous.diff.chain if previous.diff is not None else 0
+        if chain < REBASE_EVERY and same_layout(previous.units, df):
+            with timed('incremental'):
+                units, stats, total_gen, plant_groups, diff = apply_incremental(previous, df, minutes)
+            return Snapshot(units, MappingProxyType(stats), total_gen, MappingProxyType(plant_groups),
+                            fetched_at, content_hash, diff=diff, feeds=feeds)
+
+    with timed('classify'):
+        units = classify_units(df)
+    with timed('aggregate'):
+        stats, total_gen, plant_groups = aggregate(units)
+    if previous is not None:
+        with timed('diff'):
+            diff = diff_units(previous, units, plant_groups, minutes)
+    return Snapshot(units, MappingProxyType(stats), total_gen, MappingProxyType(plant_groups),
+                    fetched_at, content_hash, diff=diff, feeds=feeds)
@@ -0,0 +1,310 @@
+"""底圖圖磚快取與代理：CartoDB dark_matter 圖磚存成本機 MBTiles (SQLite)，由本機提供
+
+每次地圖重新渲染，瀏覽器都會再向公開 CDN 要一次台灣一帶 zoom 7–12 的同一批圖磚；
+在管制的維運網路上很慢，連不到 CartoDB 的網路則完全載不出底圖。啟用後：
+
+    # 預先下載台灣範圍 (含金馬澎與蘭嶼綠島) 的 zoom 7–12 圖磚，約四千多張
+    python -m powermap.tiles seed --db cache/tiles.mbtiles
+
+    # 提供 http://<host>:8090/tiles/{z}/{x}/{y}.png (沒有的圖磚才向上游抓並存起來；--offline 只讀)
+    python -m powermap.tiles serve --port 8090
+
+app.py 設定 POWERMAP_TILES_PORT 時會在背景自己啟動代理並補齊預載範圍；
+地圖 (app.py / appv9.py / 增量地圖) 改用 POWERMAP_TILES_URL 指定的圖磚網址：
+
+    POWERMAP_TILES_PORT=8090                                            app.py 內建代理的連接埠 (0 為不啟動)
+    POWERMAP_TILES_HOST=10.0.0.5                                        代理綁定的位址 (預設 127.0.0.1，只有本機連得到)
+    POWERMAP_TILES_URL=http://ops-display:8090/tiles/{z}/{x}/{y}.png    瀏覽器使用的網址 (預設 http://<host>:<port>/...)
+    POWERMAP_TILES_DB=cache/tiles.mbtiles                               圖磚庫位置
+    POWERMAP_TILES_UPSTREAM=""                                          上游網址；設為空字串則只用圖磚庫裡已有的
+
+看板在別台機器時，把 POWERMAP_TILES_HOST 設成它連得到的位址即可；綁在 0.0.0.0 時推不出
+瀏覽器該連哪裡，必須另外設定 POWERMAP_TILES_URL (否則地圖照舊直接向 CartoDB 要圖磚)。
+都沒設定時維持原本的行為。圖磚回應帶長效快取標頭，同一個瀏覽器重新渲染地圖時不必再問伺服器。
+
+這裡只處理底圖圖磚：folium 地圖與增量地圖 (frontend/livemap) 的 Leaflet 等 JS/CSS
+仍由公開 CDN (cdn.jsdelivr.net 等) 載入，完全隔離的網路要另外提供這些檔案。
+"""
+import argparse
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .feed import make_session
+from .metrics import tile_requests
+
+log = logging.getLogger(__name__)
+
+CARTO_URL = "https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}.png"
+CARTO_RETINA_URL = "https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png"
+TILES_ATTR = ('&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors '
+              '&copy; <a href="https://carto.com/attributions">CARTO</a>')
+
+TILES_PORT = int(os.environ.get("POWERMAP_TILES_PORT", "0"))
+TILES_HOST = os.environ.get("POWERMAP_TILES_HOST", "127.0.0.1")  # 與量測端點一樣預設只綁本機；要給看板用時明確設定
+TILES_DB = os.environ.get("POWERMAP_TILES_DB", os.path.join(os.environ.get("POWERMAP_CACHE_DIR", "cache"), "tiles.mbtiles"))
+UPSTREAM_URL = os.environ.get("POWERMAP_TILES_UPSTREAM", CARTO_URL)
+WILDCARD_HOSTS = ("", "0.0.0.0", "::")
+
+TAIWAN_BBOX = (118.0, 21.6, 122.3, 26.6)   # (西, 南, 東, 北)：本島與金門、馬祖、澎湖、蘭嶼綠島
+SEED_ZOOMS = range(7, 13)
+MAX_AGE = 30 * 24 * 3600                    # 底圖很少變動：瀏覽器快取 30 天
+
+
+def proxy_url(host=TILES_HOST, port=TILES_PORT):
+    """代理對瀏覽器的圖磚網址 (由綁定的位址推得)；沒有啟動代理，或綁在萬用位址推不出來時回傳 None"""
+    if not port or host in WILDCARD_HOSTS:
+        return None
+    if ':' in host:
+        host = f"[{host}]"     # IPv6
+    return f"http://{host}:{port}/tiles/{{z}}/{{x}}/{{y}}.png"
+
+
+TILES_URL = os.environ.get("POWERMAP_TILES_URL") or proxy_url()
+
+
+def map_tiles(tiles=None):
+    """folium.Map 的底圖參數：自訂網址要帶 attr；都沒設定時沿用 CartoDB dark_matter"""
+    tiles = tiles or TILES_URL
+    if tiles is None or '{' not in tiles:
+        return {'tiles': tiles or 'CartoDB dark_matter'}
+    return {'tiles': tiles, 'attr': TILES_ATTR}
+
+
+def browser_tiles():
+    """(圖磚網址, attribution)：給自己組 Leaflet 圖層的前端元件 (增量地圖) 用"""
+    return TILES_URL or CARTO_RETINA_URL, TILES_ATTR
+
+
+# ---------------------------------------------------------
+# 圖磚座標 (Web Mercator / XYZ)
+# ---------------------------------------------------------
+def tile_xy(lon, lat, zoom):
+    n = 2 ** zoom
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(bbox=TAIWAN_BBOX, zooms=SEED_ZOOMS):
+    """bbox 範圍內各 zoom 的所有圖磚 [(z, x, y), ...]"""
+    west, south, east, north = bbox
+    tiles = []
+    for z in zooms:
+        (x0, y0), (x1, y1) = tile_xy(west, north, z), tile_xy(east, south, z)
+        tiles += [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+    return tiles
+
+
+# ---------------------------------------------------------
+# 圖磚庫 (MBTiles)
+# ---------------------------------------------------------
+class TileStore:
+    """MBTiles 圖磚庫：tiles(zoom_level, tile_column, tile_row, tile_data)，tile_row 依規格為 TMS (由南往北)
+
+    每個執行緒各用一個連線；WAL 模式下代理寫入新圖磚時不會擋住其他讀取。
+    """
+
+    def __init__(self, path=TILES_DB, name="CartoDB dark_matter"):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+                                              PRIMARY KEY (zoom_level, tile_column, tile_row));
+        """)
+        west, south, east, north = TAIWAN_BBOX
+        db.executemany("INSERT OR IGNORE INTO metadata VALUES (?, ?)", [
+            ('name', name), ('format', 'png'), ('type', 'baselayer'), ('attribution', TILES_ATTR),
+            ('bounds', f"{west},{south},{east},{north}"), ('minzoom', str(SEED_ZOOMS[0])), ('maxzoom', str(SEED_ZOOMS[-1])),
+        ])
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+        return db
+
+    @staticmethod
+    def _row(z, y):
+        return (1 << z) - 1 - y    # XYZ -> TMS
+
+    def get(self, z, x, y):
+        row = self._db().execute("SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+                                 (z, x, self._row(z, y))).fetchone()
+        return row[0] if row else None
+
+    def put(self, z, x, y, data):
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (z, x, self._row(z, y), sqlite3.Binary(data)))
+        db.commit()
+
+    def missing(self, tiles):
+        """tiles 之中還沒存進圖磚庫的 (預載時略過已有的)"""
+        have = set(self._db().execute("SELECT zoom_level, tile_column, tile_row FROM tiles"))
+        return [(z, x, y) for z, x, y in tiles if (z, x, self._row(z, y)) not in have]
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+
+class TileProxy:
+    """先查圖磚庫，沒有才向上游抓並存起來；upstream 為空時只讀 (連不到上游的網路)"""
+
+    def __init__(self, store, upstream=UPSTREAM_URL, timeout=(5, 15), session=None):
+        self.store = store
+        self.upstream = upstream
+        self.timeout = timeout
+        # 圖磚會存起來給所有訪客：公開 CDN 一定要驗證憑證 (不沿用台電專用的 verify=False)
+        self.session = session or make_session(pool_size=8, verify=True)
+        # 多位訪客同時要同一張沒快取的圖磚時只向上游抓一次
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    def get(self, z, x, y):
+        """圖磚內容 (bytes)；離線時沒有或上游失敗回傳 None"""
+        data = self.store.get(z, x, y)
+        if data is not None:
+            tile_requests.inc('hit')
+            return data
+        if not self.upstream:
+            tile_requests.inc('missing')
+            return None
+        with self._locks[hash((z, x, y)) % len(self._locks)]:
+            data = self.store.get(z, x, y)     # 等鎖的期間別的執行緒可能已經抓好了
+            if data is not None:
+                tile_requests.inc('hit')
+                return data
+            try:
+                data = self._fetch(z, x, y)
+            except Exception as e:
+                tile_requests.inc('error')
+                log.warning("圖磚 %d/%d/%d 抓取失敗: %s", z, x, y, e)
+                return None
+            self.store.put(z, x, y, data)
+        tile_requests.inc('fetched')
+        return data
+
+    def _fetch(self, z, x, y):
+        url = self.upstream.format(s='abcd'[(x + y) % 4], z=z, x=x, y=y, r='')
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.content
+
+
+def seed(proxy, bbox=TAIWAN_BBOX, zooms=SEED_ZOOMS, workers=4):
+    """預先下載 bbox 範圍的圖磚 (已有的略過)；回傳 (範圍內總數, 這次下載數, 失敗數)"""
+    tiles = tile_range(bbox, zooms)
+    todo = proxy.store.missing(tiles)
+    if todo and not proxy.upstream:
+        log.warning("離線模式：圖磚庫還缺 %d 張，無法預載", len(todo))
+        return len(tiles), 0, len(todo)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile-seed") as pool:
+        ok = sum(data is not None for data in pool.map(lambda t: proxy.get(*t), todo))
+    return len(tiles), ok, len(todo) - ok
+
+
+# ---------------------------------------------------------
+# HTTP 代理
+# ---------------------------------------------------------
+class TileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    proxy = None
+    PATH = re.compile(r"^/tiles/(\d+)/(\d+)/(\d+)\.png$")
+
+    def do_GET(self):
+        match = self.PATH.match(self.path.split('?')[0])
+        if match is None:
+            self._send(404, b"not found", "text/plain")
+            return
+        z, x, y = map(int, match.groups())
+        if z > 22 or x >= 1 << z or y >= 1 << z:
+            self._send(404, b"not found", "text/plain")
+            return
+        data = self.proxy.get(z, x, y)
+        if data is None:
+            # 離線沒有這張 (404) 或上游失敗 (502)：都不讓瀏覽器快取，之後還有機會補上
+            status = 502 if self.proxy.upstream else 404
+            self._send(status, b"", "text/plain", {'Cache-Control': 'no-store'})
+            return
+        self._send(200, data, "image/png", {'Cache-Control': f"public, max-age={MAX_AGE}, immutable"})
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(proxy, host=TILES_HOST, port=8090):
+    handler = type("PowermapTileHandler", (TileHandler,), {'proxy': proxy})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(port=TILES_PORT, host=TILES_HOST, db=TILES_DB, upstream=UPSTREAM_URL, prefetch=True):
+    """在背景執行緒提供圖磚代理 (app.py 用)；prefetch 時另開執行緒補齊預載範圍。回傳 server"""
+    proxy = TileProxy(TileStore(db), upstream)
+    server = make_server(proxy, host, port)
+    threading.Thread(target=server.serve_forever, name="powermap-tiles", daemon=True).start()
+    if prefetch and upstream:
+        threading.Thread(target=seed, args=(proxy,), name="powermap-tile-seed", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CartoDB dark_matter 底圖的本機快取與代理")
+    parser.add_argument("command", choices=("seed", "serve"))
+    parser.add_argument("--db", default=TILES_DB, help="MBTiles 圖磚庫路徑")
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help="上游圖磚網址 ({s} {z} {x} {y})")
+    parser.add_argument("--offline", action="store_true", help="只提供圖磚庫裡已有的圖磚")
+    parser.add_argument("--min-zoom", type=int, default=SEED_ZOOMS[0])
+    parser.add_argument("--max-zoom", type=int, default=SEED_ZOOMS[-1])
+    parser.add_argument("--bbox", type=float, nargs=4, default=TAIWAN_BBOX, metavar=("W", "S", "E", "N"))
+    parser.add_argument("--workers", type=int, default=4, help="預載時的並行下載數")
+    parser.add_argument("--host", default=TILES_HOST)
+    parser.add_argument("--port", type=int, default=TILES_PORT or 8090)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    proxy = TileProxy(TileStore(args.db), None if args.offline else args.upstream)
+    if args.command == 'seed':
+        total, ok, failed = seed(proxy, args.bbox, range(args.min_zoom, args.max_zoom + 1), args.workers)
+        print(f"範圍內 {total} 張圖磚：這次下載 {ok} 張，失敗 {failed} 張；圖磚庫共 {len(proxy.store)} 張 -> {args.db}")
+        return
+
+    server = make_server(proxy, args.host, args.port)
+    log.info("圖磚代理啟動: http://%s:%d/tiles/{z}/{x}/{y}.png (%s)", args.host, args.port,
+             "離線" if not proxy.upstream else f"上游 {proxy.upstream}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""暖啟動：把最後一份成功的快照與渲染好的地圖存到本機，重啟時直接讀回
+
+    <root>/current            -> 目前有效的資料夾名稱 (以 os.replace 原子性切換)
+    <root>/snap-<hash>/units.parquet   已分類的機組表 (name/type/gen/category/color/plant_key)
+    <root>/snap-<hash>/meta.json       資料時間、內容雜湊、stats、total_gen
+    <root>/snap-<hash>/map.html        build_map 渲染好的地圖
+
+新的資料夾寫完才切換 current，寫到一半當掉也只會留下舊的那份。
+讀回來的快照標記為 restored，畫面上會註明是磁碟快取，同時背景照常向台電抓取。
+"""
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from types import MappingProxyType
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .aggregate import aggregate
+from .snapshot import Snapshot
+
+log = logging.getLogger(__name__)
+
+UNIT_COLUMNS = ('name', 'type', 'gen', 'category', 'color', 'plant_key')
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class WarmStart:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _current(self):
+        try:
+            with open(os.path.join(self.root, "current"), encoding='utf-8') as f:
+                return os.path.join(self.root, f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def save(self, snapshot, map_html=None):
+        """寫入一份新快照 (與地圖 HTML)，完成後才切換 current"""
+        name = f"snap-{(snapshot.content_hash or uuid.uuid4().hex)[:16]}"
+        final = os.path.join(self.root, name)
+        if final == self._current():
+            return final
+        work = os.path.join(self.root, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+        os.makedirs(work)
+        try:
+            units = snapshot.units[list(UNIT_COLUMNS)].astype({'gen': float})
+            pq.write_table(pa.Table.from_pandas(units, preserve_index=False), os.path.join(work, "units.parquet"))
+            meta = {
+                'fetched_at': snapshot.fetched_at.isoformat(), 'content_hash': snapshot.content_hash,
+                'stats': dict(snapshot.stats), 'total_gen': snapshot.total_gen,
+            }
+            _write_atomic(os.path.join(work, "meta.json"), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            if map_html is not None:
+                _write_atomic(os.path.join(work, "map.html"), map_html.encode('utf-8'))
+            if os.path.exists(final):
+                shutil.rmtree(final)
+            os.replace(work, final)
+        except BaseException:
+            shutil.rmtree(work, ignore_errors=True)
+            raise
+        _write_atomic(os.path.join(self.root, "current"), name.encode('utf-8'))
+        self._prune(keep=name)
+        return final
+
+    def _prune(self, keep):
+        for entry in os.listdir(self.root):
+            if entry.startswith(("snap-", ".snap-")) and entry != keep:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+
+    def load(self):
+        """(快照, 地圖 HTML 或 None)；沒有可用的快取時回傳 None"""
+        path = self._current()
+        if path is None or not os.path.isdir(path):
+            return None
+        try:
+            with open(os.path.join(path, "meta.json"), encoding='utf-8') as f:
+                meta = json.load(f)
+            units = pq.read_table(os.path.join(path, "units.parquet")).to_pandas()
+            map_html = None
+            if os.path.exists(os.path.join(path, "map.html")):
+                with open(os.path.join(path, "map.html"), encoding='utf-8') as f:
+                    map_html = f.read()
+            # 電廠歸戶只需 bincount (毫秒級)，不必重新分類；統計沿用存檔的數字
+            _, _, plant_groups = aggregate(units)
+            snapshot = Snapshot(units, MappingProxyType(meta['stats']), meta['total_gen'], MappingProxyType(plant_groups),
+                                datetime.fromisoformat(meta['fetched_at']), meta['content_hash'], restored=True)
+        except (OSError, ValueError, KeyError, TypeError, pa.ArrowException) as e:
+            # 欄位不全或格式不對 (例如舊版留下的快取) 一樣當成沒有快取
+            log.warning("暖啟動快取無法讀取，略過: %r", e)
+            return None
+        return snapshot, map_html
@@ -0,0 +1,39 @@
+"""機組分類與電廠彙總"""
+import pandas as pd
+
+from powermap.aggregate import aggregate, classify_units
+
+
+def units(rows):
+    return classify_units(pd.DataFrame(rows, columns=['name', 'type', 'gen']))
+
+
+def test_classify_and_aggregate():
+    df = units([("大潭CC#1", "燃氣", 500.0), ("大潭CC#2", "燃氣", 300.0), ("明潭#1", "抽蓄", -200.0),
+                ("核三#2", "核能", 900.0), ("神秘機組", "其他", 5.0)])
+    assert df['category'].tolist() == ["燃氣", "燃氣", "抽蓄", "核能", "其他"]
+    assert df['plant_key'].tolist()[:4] == ["大潭", "大潭", "明潭", "核三"]
+    assert pd.isna(df['plant_key'].iloc[4])
+
+    stats, total_gen, plant_groups = aggregate(df)
+    assert (stats['燃氣'], stats['抽蓄'], stats['核能'], stats['其他']) == (800.0, 0, 900.0, 5.0)
+    assert total_gen == 1705.0                      # 只計正向發電量
+    assert list(plant_groups) == ["大潭", "明潭", "核三"]
+    assert plant_groups["明潭"].total_gen == -200.0  # 電廠合計為淨發電量 (含抽水)
+    assert plant_groups["大潭"].unit_count == 2
+
+
+def test_aggregate_without_located_units():
+    stats, total_gen, plant_groups = aggregate(units([("神秘機組", "其他", 5.0), ("另一台", "其他", 6.0)]))
+    assert total_gen == 11.0 and plant_groups == {}
+
+
+def test_missing_name_or_type_is_not_misclassified():
+    # 缺值不可借用其他機組的類別或電廠 (factorize 的 -1 代碼)
+    df = units([("台中#1", "燃煤", 500.0), ("大潭CC#1", "燃氣", 300.0), ("神秘", None, 4.0), (None, "燃氣", 3.0)])
+    assert df['category'].tolist() == ["燃煤", "燃氣", "其他", "燃氣"]
+    assert pd.isna(df['plant_key'].iloc[2])
+
+    stats, total_gen, plant_groups = aggregate(df)
+    assert (stats['燃煤'], stats['燃氣'], stats['其他']) == (500.0, 303.0, 4.0)
+    assert plant_groups["大潭"].unit_count == 1 and plant_groups["台中"].unit_count == 1
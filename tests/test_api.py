@@ -0,0 +1,93 @@
+"""JSON API：預先算好的回應、強 ETag / 304 與壓縮協商 (實際起一個 server)"""
+import gzip
+import http.client
+import json
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from powermap.api import build_responses, make_server
+from powermap.poller import SnapshotPoller
+from powermap.snapshot import TW_TZ, build_snapshot
+
+T0 = TW_TZ.localize(datetime(2026, 1, 5, 10, 0))
+ROWS = [("大潭CC#1", "燃氣", 500.0), ("大潭CC#2", "燃氣", 300.0), ("台中#1", "燃煤", 550.0),
+        ("明潭#1", "抽蓄", -200.0), ("核三#2", "核能", 900.0), ("神秘機組", "其他", 5.0)]
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    return build_snapshot(pd.DataFrame(ROWS, columns=['name', 'type', 'gen']), T0, content_hash="abc123")
+
+
+@pytest.fixture(scope="module")
+def server(snapshot):
+    poller = SnapshotPoller(lambda: None, initial=snapshot)
+    server = make_server(poller, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path, **headers):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    try:
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        return response, response.read()
+    finally:
+        conn.close()
+
+
+def test_build_responses_content(snapshot):
+    responses = build_responses(snapshot)
+    assert set(responses) == {'/snapshot', '/plants.geojson', '/units', '/regions', '/changes'}
+
+    summary = json.loads(responses['/snapshot'].body)
+    assert summary['total_gen'] == 2255.0 and summary['stats']['燃氣'] == 800.0
+    mix = {row['category']: row['pct'] for row in summary['mix']}
+    assert mix['燃氣'] == round(800 / 2255 * 100, 2) and mix['抽蓄'] == 0.0
+
+    features = json.loads(responses['/plants.geojson'].body)['features']
+    taan = next(f for f in features if f['properties']['key'] == "大潭")
+    assert taan['properties']['units'] == 2 and taan['properties']['total_gen'] == 800.0
+
+    units = json.loads(responses['/units'].body)
+    assert len(units) == len(ROWS) and units[-1]['plant_key'] is None    # 缺值輸出成 null
+    assert json.loads(responses['/changes'].body)['base'] is None          # 沒有上一份快照
+    etags = {r.etag for r in responses.values()}
+    assert len(etags) == len(responses) and all(e.startswith('"') and e.endswith('"') for e in etags)
+
+
+def test_etag_and_if_none_match(server):
+    response, body = get(server, "/snapshot")
+    etag = response.getheader('ETag')
+    assert response.status == 200 and etag and json.loads(body)['total_gen'] == 2255.0
+
+    response, body = get(server, "/snapshot", **{'If-None-Match': etag})
+    assert response.status == 304 and body == b""
+    assert get(server, "/snapshot", **{'If-None-Match': '"stale"'})[0].status == 200
+
+
+def test_accept_encoding_gzip_and_identity(server):
+    plain, body = get(server, "/units")
+    assert plain.getheader('Content-Encoding') is None and plain.getheader('Vary') == 'Accept-Encoding'
+
+    response, compressed = get(server, "/units", **{'Accept-Encoding': 'gzip, deflate'})
+    assert response.getheader('Content-Encoding') == 'gzip'
+    assert gzip.decompress(compressed) == body
+
+
+def test_accept_encoding_prefers_brotli(server):
+    brotli = pytest.importorskip("brotli")
+    response, compressed = get(server, "/units", **{'Accept-Encoding': 'gzip, br'})
+    assert response.getheader('Content-Encoding') == 'br'
+    assert brotli.decompress(compressed) == get(server, "/units")[1]
+
+
+def test_unknown_path_is_404(server):
+    response, body = get(server, "/nope")
+    assert response.status == 404 and json.loads(body) == {'error': 'not found'}
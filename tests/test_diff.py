@@ -0,0 +1,60 @@
+"""快照之間的比對：增量路徑與整份重算、依機組名稱對齊 (新增/移除)"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from powermap.snapshot import TW_TZ, build_snapshot
+
+T0 = TW_TZ.localize(datetime(2026, 1, 5, 10, 0))
+BASE = [("大潭CC#1", "燃氣", 500.0), ("大潭風力#1", "風力", 10.0), ("明潭#1", "抽蓄", 200.0),
+        ("台中#1", "燃煤", 550.0), ("某某光電", "太陽能", 30.0)]
+
+
+def units(rows):
+    return pd.DataFrame(rows, columns=['name', 'type', 'gen'])
+
+
+def test_incremental_matches_full_rebuild():
+    prev = build_snapshot(units(BASE), T0, content_hash="a")
+    rows = [("大潭CC#1", "燃氣", 520.0), ("大潭風力#1", "風力", 10.0), ("明潭#1", "抽蓄", -180.0),
+            ("台中#1", "燃煤", 550.0), ("某某光電", "太陽能", 0.0)]
+    t1 = T0 + timedelta(minutes=10)
+    inc = build_snapshot(units(rows), t1, content_hash="b", previous=prev)
+    full = build_snapshot(units(rows), t1, content_hash="b")
+
+    assert inc.diff.incremental and inc.diff.base == "a" and inc.diff.minutes == 10
+    assert dict(inc.stats) == pytest.approx(dict(full.stats))
+    assert inc.total_gen == pytest.approx(full.total_gen)
+    assert {k: g.total_gen for k, g in inc.plant_groups.items()} == \
+        pytest.approx({k: g.total_gen for k, g in full.plant_groups.items()})
+
+    changed = inc.diff.units.set_index('name')
+    assert sorted(changed.index) == ["大潭CC#1", "明潭#1", "某某光電"]
+    assert changed.loc["大潭CC#1", ['delta', 'ramp']].tolist() == [20.0, 2.0]
+    assert changed['switched'].to_dict() == {"大潭CC#1": False, "明潭#1": True, "某某光電": False}
+    assert inc.diff.switched['name'].tolist() == ["明潭#1"]
+    assert set(inc.diff.plants.index) == {"大潭", "明潭", changed.loc["某某光電", 'plant_key']}
+
+
+def test_layout_change_reports_added_and_removed():
+    prev = build_snapshot(units(BASE), T0, content_hash="a")
+    rows = [("大潭CC#1", "燃氣", 500.0), ("大潭風力#1", "風力", 10.0), ("明潭#1", "抽蓄", 200.0),
+            ("台中#2", "燃煤", 480.0), ("某某光電", "太陽能", 30.0)]
+    snap = build_snapshot(units(rows), T0 + timedelta(minutes=5), previous=prev)
+
+    assert not snap.diff.incremental
+    diff = snap.diff.units.set_index('name')
+    assert diff['status'].to_dict() == {"台中#2": "added", "台中#1": "removed"}
+    assert diff.loc["台中#1", ['prev_gen', 'gen', 'delta']].tolist() == [550.0, 0.0, -550.0]
+    assert diff.loc["台中#2", ['prev_gen', 'gen']].tolist() == [0.0, 480.0]
+    assert snap.diff.plants.loc["台中", 'delta'] == -70.0
+    assert snap.diff.movers(1, by='plants').index.tolist() == ["台中"]
+
+
+def test_duplicate_names_align_one_to_one():
+    rows = [("大潭CC#1", "燃氣", 5.0), ("大潭CC#1", "燃氣", 6.0)]
+    prev = build_snapshot(units(rows), T0)
+    snap = build_snapshot(units([("大潭CC#1", "燃氣", 5.0)]), T0 + timedelta(minutes=1), previous=prev)
+    diff = snap.diff.units
+    assert diff['status'].tolist() == ["removed"] and diff['prev_gen'].tolist() == [6.0]
@@ -0,0 +1,141 @@
+"""001.json 下載與解析：串流解析與整份解碼結果一致、條件式請求與內容雜湊"""
+import io
+import json
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+import requests
+
+from powermap.feed import BOM, FeedClient, decode_payload, iter_records, read_units, units_frame
+from powermap.poller import SnapshotPoller
+
+RECORDS = [
+    {"機組類型": "燃氣(LNG)", "機組名稱": "大潭CC#1", "淨發電量(MW)": "512.3", "備註": "含 \"引號\" 與 \\反斜線"},
+    {"機組類型": "核能(Nuclear)", "機組名稱": "核三#2", "淨發電量(MW)": "N/A", "備註": "[括號] {大括號}, 逗號"},
+    {"機組類型": "水力(Hydro)", "機組名稱": "明潭#1", "淨發電量(MW)": "-201.5", "備註": "換行\n與 tab\t與 é"},
+]
+
+
+def payload(records=RECORDS, data_time="2026-01-10 12:30", bom=False, ascii=False):
+    # 台電的資料時間欄 "" 放在 aaData 之後
+    text = json.dumps({"aaData": records, "": data_time}, ensure_ascii=ascii)
+    return (BOM if bom else b"") + text.encode("utf-8")
+
+
+def expected(content):
+    return units_frame(decode_payload(content))
+
+
+@pytest.mark.parametrize("bom", [False, True])
+@pytest.mark.parametrize("ascii", [False, True])   # True：中文以 \uXXXX 跳脫，切點會落在跳脫序列中間
+def test_stream_matches_full_decode_for_every_chunk_size(bom, ascii):
+    content = payload(bom=bom, ascii=ascii)
+    want = expected(content)
+    for chunk_size in range(1, 64):
+        got = read_units(io.BytesIO(content), chunk_size=chunk_size)
+        pd.testing.assert_frame_equal(got, want)
+        assert got.attrs['data_time'] == "2026-01-10 12:30"
+
+
+def test_records_and_trailing_data_time():
+    records = iter_records(io.BytesIO(payload()), chunk_size=7)
+    got = []
+    with pytest.raises(StopIteration) as stop:
+        while True:
+            got.append(next(records))
+    assert got == RECORDS
+    assert stop.value.value == "2026-01-10 12:30"
+
+
+def test_bare_array_without_data_time():
+    content = json.dumps(RECORDS, ensure_ascii=False).encode("utf-8")
+    got = read_units(io.BytesIO(content), chunk_size=5)
+    pd.testing.assert_frame_equal(got, expected(content))
+    assert 'data_time' not in got.attrs
+
+
+@pytest.mark.parametrize("content", [b'{"aaData": [{"a": 1}, {"b"', b'{"records": 1}'])
+def test_truncated_or_missing_array_raises(content):
+    with pytest.raises(ValueError):
+        read_units(io.BytesIO(content), chunk_size=4)
+
+
+# ---------------------------------------------------------
+# FeedClient / SnapshotPoller：條件式請求、內容雜湊與 commit
+# ---------------------------------------------------------
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code, self.content, self.headers = status_code, content, headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+class FakeSession:
+    """依序回傳預先排好的回應，並記下每次送出的標頭"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.sent.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+def ok(content, etag='"v1"'):
+    return FakeResponse(200, content, {'ETag': etag, 'Last-Modified': "Sat, 10 Jan 2026 04:30:00 GMT"})
+
+
+def test_not_modified_returns_none():
+    session = FakeSession(ok(payload()), FakeResponse(304))
+    client = FeedClient(session=session)
+    units, digest = client.load()
+    client.commit()
+    assert client.load() is None
+    assert session.sent[1]['If-None-Match'] == '"v1"' and 'If-Modified-Since' in session.sent[1]
+    assert client.content_hash == digest
+
+
+def test_unchanged_content_returns_none_even_with_bom():
+    content = payload()
+    session = FakeSession(ok(content), ok(content, '"v2"'), ok(BOM + content, '"v3"'))
+    client = FeedClient(session=session)
+    client.load()
+    client.commit()
+    assert client.load() is None and client.etag == '"v2"'     # 內容相同：直接記住新的驗證資訊
+    assert client.load() is None and client.etag == '"v3"'     # 只多了 BOM 也不算新資料
+
+
+def test_validators_are_not_committed_until_commit():
+    content = payload()
+    session = FakeSession(ok(content), ok(content), FakeResponse(304))
+    client = FeedClient(session=session)
+    units, digest = client.load()
+    assert (client.etag, client.content_hash) == (None, None)
+
+    assert client.load() is not None                # 沒有 commit：同樣的內容重新解析，不是「未變更」
+    assert 'If-None-Match' not in session.sent[1]
+    client.commit("不是這一份")                      # 雜湊對不上的 commit 不算數
+    assert client.content_hash is None
+    client.commit(digest)
+    assert (client.etag, client.content_hash) == ('"v1"', digest)
+    assert client.load() is None and session.sent[2]['If-None-Match'] == '"v1"'
+
+
+def test_poller_listeners_only_fire_for_new_units():
+    first, second = payload(), payload(RECORDS[:2])
+    session = FakeSession(ok(first), ok(first, '"v2"'), FakeResponse(304), ok(second, '"v3"'))
+    client = FeedClient(session=session)
+    poller = SnapshotPoller(client.load, commit=client.commit)
+    seen = poller.subscribe(MagicMock())
+
+    snap = poller.refresh()
+    assert seen.call_count == 1 and snap.content_hash == client.content_hash
+    assert poller.refresh() is snap and poller.refresh() is snap    # 內容相同 / 304：沿用同一份快照
+    assert seen.call_count == 1 and poller.last_error is None
+
+    assert len(poller.refresh().units) == 2
+    assert seen.call_count == 2
@@ -0,0 +1,118 @@
+"""多資料來源抓取：斷路器狀態轉換、退避、機組表優先交出與 commit"""
+import threading
+
+import pandas as pd
+import pytest
+
+from powermap.feeds import PRIMARY, CircuitBreaker, FeedSpec, MultiFeedFetcher, backoff_delay
+from powermap.poller import SnapshotPoller
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, reset_after=60)
+    for now in (0, 1):
+        breaker.failure(now)
+        assert breaker.state == 'closed' and breaker.allow(now)
+    breaker.failure(2)
+    assert breaker.state == 'open'
+    assert not breaker.allow(2 + 59)
+
+
+def test_breaker_half_open_after_reset_then_closes_on_success():
+    breaker = CircuitBreaker(threshold=1, reset_after=60)
+    breaker.failure(0)
+    assert breaker.allow(60)
+    assert breaker.state == 'half-open'
+    breaker.success()
+    assert (breaker.state, breaker.failures, breaker.opened_at) == ('closed', 0, None)
+
+
+def test_breaker_half_open_failure_reopens_immediately():
+    breaker = CircuitBreaker(threshold=5, reset_after=60)
+    for now in range(5):
+        breaker.failure(now)
+    assert breaker.allow(64) and breaker.state == 'half-open'
+    breaker.failure(64)                # 試探失敗：不必再累積到門檻
+    assert breaker.state == 'open' and breaker.opened_at == 64
+    assert not breaker.allow(100)
+    assert breaker.allow(124)
+
+
+@pytest.mark.parametrize("failures, low, high", [(1, 2.5, 5), (2, 5, 10), (3, 10, 20), (10, 150, 300)])
+def test_backoff_delay_grows_and_is_capped(failures, low, high):
+    for _ in range(20):
+        assert low <= backoff_delay(failures, base=5, cap=300) <= high
+
+
+class FakeClient:
+    """FeedClient 的替身：load() 等 release 之後回傳 (內容, 雜湊)，已 commit 的內容視為未變更"""
+
+    def __init__(self, value, digest, release=None):
+        self.value, self.digest = value, digest
+        self.release = release
+        self.committed = []
+
+    def load(self):
+        if self.release is not None:
+            self.release.wait(5)
+        if self.digest in self.committed:
+            return None
+        return self.value, self.digest
+
+    def commit(self, digest=None):
+        self.committed.append(digest)
+
+
+def make_fetcher(release):
+    fetcher = MultiFeedFetcher([FeedSpec(PRIMARY, "http://units.invalid/"), FeedSpec('load', "http://load.invalid/")])
+    units = pd.DataFrame({'name': ['大潭CC#1'], 'type': ['燃氣(LNG)'], 'gen': [500.0]})
+    fetcher.feeds[PRIMARY].client = FakeClient(units, "h1")
+    fetcher.feeds['load'].client = FakeClient({'curr_load': 1}, "l1", release)
+    return fetcher
+
+
+def test_primary_is_handed_over_without_waiting_for_extras():
+    release = threading.Event()
+    fetcher = make_fetcher(release)
+    try:
+        units, content_hash, extras = fetcher.load()
+        assert content_hash == "h1" and len(units) == 1
+        assert extras == {}                            # 附屬資料還沒回來：不等它
+        fetcher.commit()
+
+        release.set()
+        fetcher.feeds['load'].pending.result(5)
+        units, content_hash, extras = fetcher.load()   # 下一輪再併進來
+        assert units is None and content_hash == "h1"
+        assert extras == {'load': {'curr_load': 1}}
+    finally:
+        release.set()
+        fetcher.close()
+
+
+def broken_build(*args, **kwargs):
+    raise ValueError("快照建不起來")
+
+
+def test_content_is_committed_only_after_snapshot_is_published():
+    fetcher = make_fetcher(threading.Event())
+    fetcher.feeds['load'].client.release.set()
+    try:
+        poller = SnapshotPoller(fetcher.load, commit=fetcher.commit)
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr("powermap.poller.build_snapshot", broken_build)
+            poller.refresh()
+        assert poller.snapshot is None and isinstance(poller.last_error, ValueError)
+        assert fetcher.content_hash is None and fetcher.feeds[PRIMARY].client.committed == []
+
+        poller.refresh()
+        assert poller.snapshot is not None and poller.snapshot.content_hash == "h1"
+        assert fetcher.content_hash == "h1" and fetcher.feeds[PRIMARY].client.committed == ["h1"]
+    finally:
+        fetcher.close()
+
+
+def test_extras_only_update_without_snapshot_is_skipped():
+    poller = SnapshotPoller(lambda: (None, "h1", {'load': {}}), commit=lambda: pytest.fail("不應 commit"))
+    assert poller.refresh() is None
+    assert poller.last_error is None
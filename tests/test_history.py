@@ -0,0 +1,44 @@
+"""歷史資料：整點合併與查詢"""
+import glob
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pandas as pd
+
+from powermap.history import HistoryStore
+from powermap.snapshot import TW_TZ
+
+
+def snapshot(ts, gen):
+    units = pd.DataFrame({'name': ['大潭#1', '台中#1'], 'type': ['燃氣', '燃煤'], 'gen': [gen, 2 * gen],
+                          'category': ['燃氣', '燃煤'], 'plant_key': ['大潭', '台中']})
+    return SimpleNamespace(units=units, fetched_at=TW_TZ.localize(ts), content_hash=f"{gen:08.0f}")
+
+
+def files(root, pattern):
+    return sorted(os.path.basename(p) for p in glob.glob(os.path.join(root, "date=*", pattern)))
+
+
+def test_compacts_only_when_hour_rolls_over(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path), ring_size=2)
+    calls = []
+    compact = store.compact
+    monkeypatch.setattr(store, 'compact', lambda before=None: calls.append(before) or compact(before))
+
+    hour = datetime.now(TW_TZ).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    for minute in (0, 10, 20):
+        store.append(snapshot(hour + timedelta(minutes=minute), 100 + minute))
+    store.append(snapshot(hour + timedelta(hours=1), 200))
+    store.append(snapshot(hour + timedelta(hours=1, minutes=5), 205))
+
+    assert len(calls) == 1      # 只有跨過整點的那一筆
+    assert files(str(tmp_path), "hour-*.parquet") == [f"hour-{hour:%H}.parquet"]
+    assert len(files(str(tmp_path), "snap-*.parquet")) == 2
+    assert not files(str(tmp_path), ".*.tmp")
+
+    # 超出記憶體緩衝區的範圍：由磁碟 (合併檔 + 小檔) 讀回全部五份
+    start, end = hour - timedelta(hours=1), hour + timedelta(hours=2)
+    assert store.query(start, end).num_rows == 10
+    series = store.series(start, end)
+    assert series['燃氣'].tolist() == [100, 110, 120, 200, 205]
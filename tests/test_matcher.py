@@ -0,0 +1,55 @@
+"""電廠名稱比對：最左最長、模糊歸戶與未歸戶清單"""
+import pytest
+
+from powermap.catalog import GENERIC_SOLAR_KEY, GENERIC_WIND_KEY, location_dict, plant_matcher
+from powermap.matcher import PlantMatcher
+
+
+@pytest.mark.parametrize("name, p_type, expected", [
+    # 最長的鍵值優先：不取決於 location_dict 的順序
+    ("大潭風力#1", "風力", "大潭風力"),
+    ("大潭CC#1", "燃氣", "大潭"),
+    ("台中港#2", "風力", "台中港"),
+    ("台中#1", "燃煤", "台中"),
+    ("觀園風力", "風力", "觀園風力"),
+    # 括號與空白先去掉再比對
+    ("(大潭)CC#2", "燃氣", "大潭"),
+    ("台中 港#3", "風力", "台中港"),
+])
+def test_resolve(name, p_type, expected):
+    assert plant_matcher.resolve(name, p_type) == (location_dict[expected], expected)
+
+
+@pytest.mark.parametrize("name, p_type, expected, generic", [
+    # 找不到電廠時依類型模糊歸戶
+    ("某某風場", "風力", GENERIC_WIND_KEY, "GENERIC_WIND"),
+    ("某某光電", "太陽能", GENERIC_SOLAR_KEY, "GENERIC_SOLAR"),
+    ("某某光電", "Solar", GENERIC_SOLAR_KEY, "GENERIC_SOLAR"),
+])
+def test_resolve_fallback(name, p_type, expected, generic):
+    assert plant_matcher.resolve(name, p_type) == (location_dict[generic], expected)
+
+
+def test_unlocated_keeps_name():
+    assert plant_matcher.resolve("神秘機組", "其他") == (None, "神秘機組")
+
+
+def test_leftmost_wins_over_longer_later_key():
+    matcher = PlantMatcher({"甲": [1, 1], "乙丙丁": [2, 2]})
+    assert matcher.match("甲乙丙丁") == "甲"
+    assert matcher.match("乙丙丁甲") == "乙丙丁"
+
+
+def test_unmatched_report():
+    matcher = PlantMatcher({"大潭": [25.0, 121.0], "GENERIC_WIND": [24.0, 120.0]},
+                           fallbacks=(("其他風力", [24.0, 120.0], ("風",)),))
+    for name, p_type in [("離岸風場B", "風力"), ("離岸風場A", "風力"), ("神秘機組", "其他"), ("大潭#1", "燃氣")]:
+        matcher.resolve(name, p_type)
+    assert matcher.unmatched_report() == {"其他風力": ["離岸風場A", "離岸風場B"], None: ["神秘機組"]}
+
+
+def test_unmatched_report_is_bounded():
+    matcher = PlantMatcher({"大潭": [25.0, 121.0]}, cache_size=2)
+    for i in range(5):
+        matcher.resolve(f"神秘機組{i}", "其他")
+    assert sum(len(v) for v in matcher.unmatched_report().values()) == 2
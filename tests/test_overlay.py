@@ -0,0 +1,27 @@
+"""HUD 與圖例：總發電量為 0 時圖例照樣列出各類別"""
+from powermap.catalog import order_keys
+from powermap.overlay import OVERLAY_STATIC, legend_items, overlay_html, overlay_payload
+
+STATS = {k: 0.0 for k in order_keys}
+
+
+def test_legend_percentages():
+    stats = dict(STATS, 燃氣=600.0, 燃煤=300.0, 太陽能=100.0)
+    items = {k: pct for k, _, pct in legend_items(stats, 1000.0)}
+    assert [k for k, _, _ in legend_items(stats, 1000.0)] == order_keys
+    assert (items['燃氣'], items['燃煤'], items['太陽能'], items['核能']) == (60.0, 30.0, 10.0, 0.0)
+
+
+def test_legend_keeps_every_category_at_zero_total():
+    # 例如夜間只剩抽水負載：圖例不能整個消失，各類別顯示 0%
+    items = legend_items(STATS, 0.0)
+    assert [k for k, _, _ in items] == order_keys
+    assert all(pct == 0.0 for _, _, pct in items)
+    assert [pct for _, _, pct in overlay_payload(STATS, 0.0).rows] == ["0.0"] * len(order_keys)
+
+
+def test_overlay_body_is_shared_with_static_page():
+    stats = dict(STATS, 燃氣=600.0)
+    body = overlay_html(stats, 600.0, static=False)
+    assert 'id="draggable-legend"' in body and "<style>" not in body and "<script>" not in body
+    assert overlay_html(stats, 600.0) == OVERLAY_STATIC.rstrip() + body
@@ -0,0 +1,66 @@
+"""區域彙總：電廠所在分區、多邊形邊界與各區合計"""
+import pandas as pd
+import pytest
+
+from powermap.aggregate import aggregate, classify_units
+from powermap.regions import (PLANT_ZONES, REGION_INDEX, REGIONS, UNLOCATED, ZONE_NAMES, ZONES, region_totals,
+                              regional_mix, zone_polygons)
+
+ROWS = [("大潭CC#1", "燃氣", 500.0), ("台中#1", "燃煤", 550.0), ("核三#2", "核能", 900.0), ("和平#1", "燃煤", 600.0),
+        ("塔山#1", "柴油", 20.0), ("七美#1", "柴油", 3.0), ("明潭#1", "抽蓄", -200.0), ("神秘機組", "其他", 5.0)]
+
+
+@pytest.mark.parametrize("plant, zone", [
+    ("大潭", "北部"), ("林口", "北部"), ("台中", "中部"), ("麥寮", "中部"), ("核三", "南部"), ("興達", "南部"),
+    ("和平", "東部"), ("立霧", "東部"), ("塔山", "金門"), ("珠山", "馬祖"), ("七美", "澎湖"), ("蘭嶼", "蘭嶼綠島"),
+])
+def test_known_plants_zone(plant, zone):
+    assert ZONE_NAMES[PLANT_ZONES[plant]] == zone
+
+
+@pytest.mark.parametrize("lat, lon, zone", [
+    (24.3, 118.3, "金門"),    # 外框南緣 (含)
+    (24.45, 118.1, "金門"),   # 外框西緣 (含)
+    (24.45, 118.6, None),     # 外框東緣 (不含：相鄰分區共用的邊只算一次)
+    (24.6, 118.3, None),      # 外框北緣 (不含)
+    (24.45, 118.09, None),    # 外框外
+    (24.45, 120.0, "中部"),   # 在北部的外框內、但不在北部多邊形內
+    (22.3, 114.2, None),      # 香港
+])
+def test_points_on_and_outside_bounds(lat, lon, zone):
+    code = REGION_INDEX.locate([lat], [lon])[0]
+    assert (ZONE_NAMES[code] if code >= 0 else None) == zone
+
+
+def test_regional_totals_add_up():
+    units = classify_units(pd.DataFrame(ROWS, columns=['name', 'type', 'gen']))
+    stats, total_gen, _ = aggregate(units)
+
+    mix = regional_mix(units)
+    assert list(mix.index) == [*REGIONS, UNLOCATED]        # 神秘機組沒有座標
+    assert mix['total'].sum() == pytest.approx(total_gen)
+    assert mix['net'].sum() == pytest.approx(units['gen'].sum())
+    assert mix.loc['離島', 'total'] == 23.0 and mix.loc[UNLOCATED, 'total'] == 5.0
+    assert mix.drop(columns=['total', 'net']).sum().to_dict() == pytest.approx({k: v for k, v in stats.items() if k in mix})
+
+    zones = regional_mix(units, 'zone')
+    assert (zones.loc['金門', 'total'], zones.loc['澎湖', 'total']) == (20.0, 3.0)
+    assert zones['total'].sum() == pytest.approx(total_gen)
+
+    totals = region_totals(units)
+    assert totals.sum() == pytest.approx(total_gen)
+    assert totals.to_dict() == pytest.approx(mix['total'].to_dict())
+
+
+def test_region_totals_by_time():
+    units = classify_units(pd.DataFrame(ROWS, columns=['name', 'type', 'gen']))
+    history = pd.concat([units.assign(ts=1), units.assign(ts=2, gen=units['gen'] * 2)], ignore_index=True)
+    totals = region_totals(history, by='ts')
+    assert list(totals.index) == [1, 2]
+    assert totals.loc[2].sum() == pytest.approx(2 * totals.loc[1].sum())
+
+
+def test_zone_polygons_are_closed():
+    features = zone_polygons()['features']
+    assert [f['properties']['zone'] for f in features] == list(ZONE_NAMES) and len(features) == len(ZONES)
+    assert all(f['geometry']['coordinates'][0][0] == f['geometry']['coordinates'][0][-1] for f in features)
@@ -0,0 +1,48 @@
+"""跨使用者共用的渲染快取"""
+import gc
+from dataclasses import replace
+
+import pandas as pd
+import pytest
+
+from powermap.render import RenderCache, snapshot_version
+from powermap.snapshot import build_snapshot
+
+
+def test_compute_once_per_key():
+    cache, calls = RenderCache(maxsize=2), []
+    for _ in range(3):
+        assert cache.get_or_compute('a', lambda: calls.append(1) or "html") == "html"
+    assert (len(calls), cache.hits, cache.misses) == (1, 2, 1)
+
+
+def test_lru_eviction():
+    cache = RenderCache(maxsize=2)
+    for key in 'abc':
+        cache.get_or_compute(key, lambda: key)
+    assert cache._lookup('a') is None and cache._lookup('c') == 'c'
+
+
+def test_failed_compute_releases_key_lock():
+    cache = RenderCache()
+
+    def fail():
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('a', fail)
+    assert cache._key_locks == {}
+    assert cache.get_or_compute('a', lambda: "html") == "html"
+
+
+def test_version_without_hash_is_never_reused():
+    df = pd.DataFrame([("大潭CC#1", "燃氣", 100.0)], columns=['name', 'type', 'gen'])
+    seen = set()
+    for _ in range(5):
+        snap = build_snapshot(df)
+        assert snapshot_version(snap) not in seen
+        seen.add(snapshot_version(snap))
+        assert snapshot_version(replace(snap, feeds={})) == snapshot_version(snap)
+        del snap
+        gc.collect()
+    assert snapshot_version(build_snapshot(df, content_hash="abc")) == "abc"
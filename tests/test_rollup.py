@@ -0,0 +1,53 @@
+"""多解析度彙總：分段回填與即時累加"""
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from powermap.rollup import RollupStore
+from powermap.snapshot import TW_TZ
+
+END = TW_TZ.localize(datetime(2026, 1, 10, 0, 0))
+INDEX = pd.date_range(END - timedelta(days=3), END, freq='30min')   # 含兩端
+
+
+class FakeHistory:
+    """HistoryStore.series 的替身：每 30 分鐘一份快照，[start, end] 兩端都含"""
+
+    def __init__(self):
+        self.calls = []
+
+    def series(self, start, end=None, by='category'):
+        self.calls.append((start, end))
+        rows = INDEX[(INDEX >= start) & (INDEX <= end)]
+        columns = ['燃氣', '燃煤'] if by == 'category' else ['大潭', '台中']
+        return pd.DataFrame({c: 100.0 for c in columns}, index=rows)
+
+
+def test_chunked_backfill_counts_each_snapshot_once():
+    rollups, history = RollupStore(), FakeHistory()
+    count = rollups.backfill(history, END - timedelta(days=3), END, chunk=timedelta(hours=7))
+    assert count == len(INDEX) - 1             # end 那一刻留給即時累加
+    assert len(history.calls) == 2 * 11         # 72 小時 / 7 小時一段，類別與電廠各讀一次
+    assert rollups.covered_from == END - timedelta(days=3)
+    daily = rollups.series(END - timedelta(days=3), END, resolution='1d')
+    assert (daily == 100.0).all().all()
+    counts = [n for n, _ in rollups._buckets[('category', '1d')].values()]
+    assert sum(counts) == len(INDEX) - 1
+
+
+def test_live_snapshot_at_end_is_not_double_counted():
+    rollups = RollupStore()
+    rollups.backfill(FakeHistory(), END - timedelta(days=1), END)
+    rollups.add(END, {'燃氣': 100.0, '燃煤': 100.0}, {'大潭': 100.0, '台中': 100.0})
+    assert sum(n for n, _ in rollups._buckets[('category', '1h')].values()) == 49
+
+
+def test_start_backfill_runs_in_background():
+    rollups = RollupStore().start_backfill(FakeHistory(), END - timedelta(days=3), END)
+    for _ in range(100):
+        if not rollups.backfilling:
+            break
+        time.sleep(0.02)
+    assert not rollups.backfilling
+    assert rollups.covered_from == END - timedelta(days=3)
@@ -0,0 +1,30 @@
+"""快照：所有 session 共用的唯讀物件"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from powermap.snapshot import TW_TZ, build_snapshot
+
+T0 = TW_TZ.localize(datetime(2026, 1, 5, 10, 0))
+
+
+def units(rows):
+    return pd.DataFrame(rows, columns=['name', 'type', 'gen'])
+
+
+BASE = [("大潭CC#1", "燃氣", 500.0), ("大潭風力#1", "風力", 10.0), ("明潭#1", "抽蓄", 200.0),
+        ("台中#1", "燃煤", 550.0), ("某某光電", "太陽能", 30.0)]
+
+
+def test_snapshot_is_read_only():
+    snap = build_snapshot(units(BASE), T0)
+    with pytest.raises(TypeError):
+        snap.stats['燃氣'] = 0
+    with pytest.raises(TypeError):
+        snap.plant_groups['大潭'] = None
+    assert all(isinstance(g.coords, tuple) for g in snap.plant_groups.values())
+
+    derived = snap.units.iloc[:3]
+    derived.loc[0, 'gen'] = -1.0     # copy-on-write：衍生的表改了不影響共用的那一份
+    assert snap.units['gen'].tolist() == [500.0, 10.0, 200.0, 550.0, 30.0]
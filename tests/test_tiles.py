@@ -0,0 +1,26 @@
+"""底圖圖磚代理：瀏覽器網址由綁定的位址推得"""
+import pytest
+
+from powermap.tiles import TileProxy, TileStore, proxy_url
+
+
+@pytest.mark.parametrize("host, port, expected", [
+    ("127.0.0.1", 8090, "http://127.0.0.1:8090/tiles/{z}/{x}/{y}.png"),
+    ("10.0.0.5", 8090, "http://10.0.0.5:8090/tiles/{z}/{x}/{y}.png"),
+    ("ops-display", 9000, "http://ops-display:9000/tiles/{z}/{x}/{y}.png"),
+    ("fd00::5", 8090, "http://[fd00::5]:8090/tiles/{z}/{x}/{y}.png"),
+    ("0.0.0.0", 8090, None),        # 萬用位址：推不出瀏覽器該連哪裡
+    ("", 8090, None),
+    ("::", 8090, None),
+    ("127.0.0.1", 0, None),         # 沒有啟動代理
+])
+def test_proxy_url(host, port, expected):
+    assert proxy_url(host, port) == expected
+
+
+def test_proxy_verifies_upstream_certificates(tmp_path):
+    proxy = TileProxy(TileStore(str(tmp_path / "tiles.mbtiles")))
+    try:
+        assert proxy.session.verify is True
+    finally:
+        proxy.session.close()
@@ -0,0 +1,80 @@
+"""暖啟動：快照存檔讀回、寫到一半不會被採用、壞掉的快取退回冷啟動"""
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from powermap import warmstart
+from powermap.snapshot import TW_TZ, build_snapshot
+from powermap.warmstart import UNIT_COLUMNS, WarmStart
+
+T0 = TW_TZ.localize(datetime(2026, 1, 5, 10, 0))
+ROWS = [("大潭CC#1", "燃氣", 500.0), ("大潭CC#2", "燃氣", 300.0), ("台中#1", "燃煤", 550.0),
+        ("明潭#1", "抽蓄", -200.0), ("神秘機組", "其他", 5.0)]
+
+
+def snapshot(rows=ROWS, content_hash="aaaa1111"):
+    return build_snapshot(pd.DataFrame(rows, columns=['name', 'type', 'gen']), T0, content_hash=content_hash)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    snap = snapshot()
+    WarmStart(str(tmp_path)).save(snap, "<html>map</html>")
+    restored, map_html = WarmStart(str(tmp_path)).load()
+
+    assert restored.restored and map_html == "<html>map</html>"
+    assert (restored.fetched_at, restored.content_hash) == (snap.fetched_at, snap.content_hash)
+    pd.testing.assert_frame_equal(restored.units[list(UNIT_COLUMNS)], snap.units[list(UNIT_COLUMNS)], check_dtype=False)
+    assert dict(restored.stats) == dict(snap.stats) and restored.total_gen == snap.total_gen
+    assert list(restored.plant_groups) == list(snap.plant_groups)
+    for key, group in snap.plant_groups.items():
+        back = restored.plant_groups[key]
+        assert (back.coords, back['type'], back.total_gen, back.unit_count) == \
+               (group.coords, group['type'], group.total_gen, group.unit_count)
+
+
+def test_half_written_snapshot_is_never_current(tmp_path, monkeypatch):
+    store = WarmStart(str(tmp_path))
+    store.save(snapshot(), "old")
+
+    write_atomic = warmstart._write_atomic
+
+    def crash_on_map(path, data):
+        if path.endswith("map.html"):
+            raise OSError("磁碟滿了")
+        write_atomic(path, data)
+
+    monkeypatch.setattr(warmstart, "_write_atomic", crash_on_map)
+    with pytest.raises(OSError):
+        store.save(snapshot(ROWS[:2], content_hash="bbbb2222"), "new")
+
+    restored, map_html = WarmStart(str(tmp_path)).load()
+    assert restored.content_hash == "aaaa1111" and map_html == "old"
+    assert not [e for e in os.listdir(tmp_path) if e.endswith(".tmp")]    # 寫到一半的資料夾已清掉
+
+    # 另一個行程寫到一半 (還沒切換 current) 的資料夾也不會被讀到
+    os.makedirs(tmp_path / ".snap-cccc3333.1234abcd.tmp")
+    assert WarmStart(str(tmp_path)).load()[0].content_hash == "aaaa1111"
+
+
+def test_missing_store_is_cold_start(tmp_path):
+    assert WarmStart(str(tmp_path / "cache")).load() is None
+
+
+def test_current_pointing_nowhere_is_cold_start(tmp_path):
+    (tmp_path / "current").write_text("snap-gone", encoding='utf-8')
+    assert WarmStart(str(tmp_path)).load() is None
+
+
+@pytest.mark.parametrize("name, content", [
+    ("meta.json", b"{not json"),
+    ("meta.json", json.dumps({'fetched_at': T0.isoformat()}).encode()),   # 欄位不全
+    ("units.parquet", b"PAR1 truncated"),
+])
+def test_corrupt_store_is_cold_start(tmp_path, name, content):
+    path = WarmStart(str(tmp_path)).save(snapshot())
+    with open(os.path.join(path, name), 'wb') as f:
+        f.write(content)
+    assert WarmStart(str(tmp_path)).load() is None